@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+The streaming chat endpoint (main.views.chat_stream) needs an ASGI server, e.g.:
+    gunicorn admin.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
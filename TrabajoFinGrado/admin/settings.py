@@ -57,11 +57,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'main.middleware.SessionTimeoutMiddleware',
-    'main.middleware.CleanupMiddleware',
-    'main.middleware.PendingTeacherMiddleware',
-    'main.middleware.RejectedTeacherMiddleware',
-    'main.middleware.TeacherAccessMiddleware',
-    'main.middleware.StudentRestrictionMiddleware'
+    'main.middleware.AccessPolicyMiddleware',
 
 ]
 
@@ -163,11 +159,85 @@ AUTH_USER_MODEL = 'main.User'
 #API OPENAI
 OPENAI_API_KEY = config('OPENAI_API_KEY')
 
+# Backend de las llamadas al modelo (main.llm.FakeBackend para pruebas locales)
+LLM_BACKEND = 'main.llm.OpenAIBackend'
+LLM_BACKEND_OPTIONS = {}
+# Máximo de llamadas simultáneas a la API por proceso
+LLM_MAX_CONCURRENCY = 8
+# Tokens (aprox.) de historial reciente que se envían al modelo en el chat; lo anterior se resume
+CHAT_CONTEXT_TOKEN_BUDGET = 3000
+CHAT_SUMMARY_MAX_TOKENS = 400
+# Mensajes por página en las vistas de chat
+CHAT_PAGE_SIZE = 50
+
+#BUSQUEDA
+
+# Máximo de alumnos devueltos por una búsqueda en el panel del profesor
+STUDENT_SEARCH_LIMIT = 50
+# Alumnos por página en el listado (paginación por cursor)
+STUDENT_PAGE_SIZE = 50
+# Segundos que se guarda en caché el HTML del listado de alumnos (peticiones AJAX)
+STUDENT_LIST_CACHE_TTL = 30
+
+#FOROS
+
+# Debates por página en el índice de foros
+FORUM_PAGE_SIZE = 20
+# Comentarios por página dentro de un debate
+FORUM_COMMENTS_PAGE_SIZE = 50
+
+#MARKDOWN
+
+# Entradas de la caché LRU (por proceso) del HTML renderizado en main.rendering
+MARKDOWN_CACHE_SIZE = 1024
+
+#JOBS
+
+# Si es True los jobs se ejecutan dentro de la petición (sin worker `run_jobs`)
+JOBS_EAGER = False
+# Cada cuántos segundos renueva el worker el heartbeat del job que está ejecutando
+JOBS_HEARTBEAT_INTERVAL = 30
+# Segundos sin heartbeat tras los que un job en RUNNING vuelve a la cola (el worker se cayó)
+JOBS_RUNNING_TIMEOUT = 120
+# Intentos antes de dar un job por fallido y segundos de espera tras el primer fallo (se duplica en cada intento)
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 30
+
 
 #SESION
 
 SESSION_COOKIE_AGE = 1800  # 30 minutos en segundos
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
+# Cada cuántos segundos como mucho se actualiza 'last_activity' (y se guarda la sesión)
+SESSION_ACTIVITY_GRANULARITY = 60
+# db, cached_db, cache (usan CACHES, requieren REDIS_URL) o signed_cookies (sin escrituras en el servidor)
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + env('SESSION_BACKEND', default='db')
+
+#CACHE
+
+REDIS_URL = env('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Sin Redis la caché es locmem, una por proceso: con varios workers cada uno
+# tendría sus propias sesiones (cache) o leería copias viejas (cached_db) y los
+# usuarios perderían la sesión al azar
+if SESSION_ENGINE.endswith(('.cache', '.cached_db')) and not REDIS_URL:
+    raise ImproperlyConfigured(
+        f"SESSION_BACKEND={SESSION_ENGINE.rsplit('.', 1)[1]} necesita una caché compartida: define REDIS_URL"
+    )
 
 #EMAIL
 
@@ -177,3 +247,12 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
+
+# Los correos se guardan en OutgoingEmail y los envía el worker `send_queued_mail`
+# Si es True se envían al terminar la petición (sin worker)
+EMAIL_OUTBOX_EAGER = False
+# Intentos antes de dar un correo por fallido y segundos de espera tras el primer fallo (se duplica en cada intento)
+EMAIL_OUTBOX_MAX_ATTEMPTS = 6
+EMAIL_OUTBOX_RETRY_DELAY = 60
+# Días que se conservan los correos enviados o fallidos (los enviados ya sin contenido)
+EMAIL_OUTBOX_RETENTION_DAYS = 7
@@ -0,0 +1,72 @@
+from django.conf import settings
+
+from . import llm
+from .models import Chat
+
+
+SUMMARY_SYSTEM_PROMPT = "Eres un asistente que resume conversaciones de tutoría de programación en Python. Conserva las dudas del alumno, los conceptos explicados y el código relevante de forma breve."
+
+
+def estimate_tokens(text):
+    """Estimación aproximada (unos 4 caracteres por token), suficiente para controlar el presupuesto."""
+    return len(text) // 4 + 1
+
+
+def summarize(previous_summary, messages):
+    """Pide al modelo un resumen nuevo a partir del anterior y de los mensajes que salen de la ventana."""
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    prompt = f"""Resumen de la conversación hasta ahora:
+    {previous_summary or '(vacío)'}
+    Mensajes nuevos que hay que incorporar al resumen:
+    {transcript}
+    Devuelve únicamente el resumen actualizado."""
+
+    return llm.get_backend().chat_completion(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=getattr(settings, 'CHAT_SUMMARY_MAX_TOKENS', 400),
+    ).strip()
+
+
+def build_chat_context(chat):
+    """
+    Mensajes que se envían al modelo: el resumen acumulado de la parte antigua
+    del chat más los turnos recientes sin resumir, dentro de CHAT_CONTEXT_TOKEN_BUDGET.
+
+    Cuando los turnos sin resumir superan el presupuesto, los más antiguos se
+    incorporan al resumen hasta dejar la mitad del presupuesto libre, de forma
+    que el resumen no se recalcula en cada mensaje.
+    """
+    budget = getattr(settings, 'CHAT_CONTEXT_TOKEN_BUDGET', 3000)
+
+    # Solo se leen los mensajes posteriores al resumen, que están acotados por el presupuesto
+    recent = list(
+        chat.messages.filter(sequence__gt=chat.summary_upto)
+        .order_by('sequence')
+        .values('role', 'content', 'sequence')
+    )
+    tokens = [estimate_tokens(message['content']) for message in recent]
+
+    if sum(tokens) > budget:
+        # El último mensaje (la pregunta actual) nunca se resume
+        keep_from = len(recent) - 1
+        kept_tokens = tokens[keep_from]
+        while keep_from > 0 and kept_tokens + tokens[keep_from - 1] <= budget // 2:
+            keep_from -= 1
+            kept_tokens += tokens[keep_from]
+
+        folded, recent = recent[:keep_from], recent[keep_from:]
+        # Si la pregunta actual supera ella sola el presupuesto no hay nada que resumir
+        if folded:
+            chat.summary = summarize(chat.summary, folded)
+            chat.summary_upto = folded[-1]['sequence']
+            Chat.objects.filter(pk=chat.pk).update(summary=chat.summary, summary_upto=chat.summary_upto)
+
+    context = []
+    if chat.summary:
+        context.append({"role": "system", "content": f"Resumen de la conversación anterior: {chat.summary}"})
+    context.extend({"role": message['role'], "content": message['content']} for message in recent)
+    return context
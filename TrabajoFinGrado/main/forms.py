@@ -1,7 +1,9 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordResetForm
+from django.template.loader import render_to_string
 from django.contrib.auth import get_user_model
 from .models import User, Event, Forum, Comment
+from .outbox import queue_email
 from django.core.exceptions import ValidationError
 
 from django import forms
@@ -174,3 +176,13 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ['content']
+
+
+class OutboxPasswordResetForm(PasswordResetForm):
+    """PasswordResetForm que deja el correo en la bandeja de salida en vez de enviarlo."""
+
+    def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email, html_email_template_name=None):
+        subject = ''.join(render_to_string(subject_template_name, context).splitlines())
+        body = render_to_string(email_template_name, context)
+        html_body = render_to_string(html_email_template_name, context) if html_email_template_name else ''
+        queue_email(subject, body, [to_email], from_email, html_body=html_body)
@@ -0,0 +1,112 @@
+from django.db import transaction
+
+from . import llm
+from .models import Exam, Exercise, ExerciseSet
+
+
+EXAM_SYSTEM_PROMPT = "Eres un asistente que está generando contenido educacional para universitarios que están aprendiendo a programar en Python"
+
+
+def generate_prompt(topic, difficulty):
+    difficulty_explanation = {
+        'Easy': "El ejercicio debe ser sencillo, y no requerir conocimientos avanzados. Deberá ser fácilmente realizable y en poco tiempo",
+        'Medium': "El ejercicio debe tener un nivel intermedio de dificultad, adecuado para estudiantes con conocimientos básicos de programación. Debe requerir alrededor de 20 minutos para realizarlo y habrá que aplicar cierta lógica sobre los conceptos que trata el tema .",
+        'Hard': "El ejercicio debe ser desafiante, adecuado para estudiantes avanzados y requerir un entendimiento profundo del tema pasado como parámetro. Deberá requerir la aplicación de diversos conceptos relacionados con el tema concretado. Deberá estar pensado para realizarse en al menos, 30 minutos."
+    }
+    
+    # Define diferentes prompts en función del tema seleccionado
+    topic_prompts = {
+        1: f"Genera ejercicios de programación en Python sobre el tema 'Instrucciones y funciones' que cubran los siguientes conceptos fundamentales: Uso de funciones predefinidas (print(), help()) y creación de funciones propias con parámetros y return. 'Expresiones y tipos': Combinación de operadores aritméticos y variables. Trabajo con diferentes tipos de literales (cadenas, enteros, reales, lógicos). 'Listas y tuplas': Manipulación de listas y tuplas, acceso a elementos con índices y uso de len(). 'Diccionarios': Uso de diccionarios, modificación de valores y acceso mediante claves. 'Objetos y métodos': Uso de métodos de objetos (append() en listas) y funciones como dir() y help(). 'Control de flujo': Ejercicios con bucles for y estructuras if-elif-else. 'Módulos y paquetes': Importación y uso de módulos (random, matplotlib). 'Ficheros': Lectura de archivos de texto y CSV con open() y el módulo csv. 'Función principal': Organización del código con una función main(). Incluye ejemplos prácticos de dificultad progresiva para que los estudiantes comprendan estos conceptos.",
+        2: f"Genera ejercicios de programación en Python sobre el tema 'Variables'  que cubran los siguientes conceptos fundamentales: Almacenan valores; se explica cómo asignar, renombrar, y eliminar valores. 'Tipos Predefinidos': Incluyen lógicos, numéricos, cadenas, y contenedores (tuplas, listas, conjuntos, diccionarios), con operaciones básicas sobre ellos. 'Expresiones': Uso de operadores y conversión de tipos. 'Entrada/Salida': Uso de input y print, formateo de cadenas con format y f-strings. 'Diccionarios': Almacenan pares clave-valor, son mutables y accesibles por clave. 'Operaciones con Contenedores': Agregar, eliminar, concatenar y iterar sobre listas, conjuntos y diccionarios.",
+        3: f"Genera ejercicios de programación en Python sobre el tema 'Instrucciones Condicionales y Bucles' que cubran los siguientes conceptos fundamentales: Orden de ejecución de instrucciones, incluyendo llamadas a funciones y retornos. 'Instrucción if': Permite ejecutar bloques de código según condiciones con if, elif, y else. 'Bucles': while ejecuta un bloque mientras la condición sea verdadera, y for itera sobre secuencias. Incluye el uso de funciones range y zip para generar secuencias de números y recorrer múltiples secuencias simultáneamente, y la función enumerate para proporcionar índices y valores. 'Instrucción break': Termina un bucle antes de completarlo, mejorando la eficiencia. 'Tratamientos Secuenciales': Procesamiento de datos secuenciales con bucles y condiciones, como mostrar nombres, obtener artistas únicos, filtrar por año y duración, calcular tiempos totales, contar canciones, y encontrar la canción más larga o corta.",
+        4: f"Genera ejercicios de programación en Python sobre el tema 'Definición e Invocación de Funciones' que cubran los siguientes conceptos fundamentales: Crear y llamar bloques de instrucciones para ejecutar tareas específicas. 'Paso de Parámetros': Utilizar variables dentro de funciones que reciben valores al ser invocadas, con opciones de valores predeterminados y referencia por nombre. 'Funciones como Parámetros': Pasar funciones como argumentos a otras funciones y emplear funciones lambda para definiciones rápidas y anónimas. 'Tipado de Funciones': Especificar tipos de parámetros y valores de retorno para mejorar la claridad y detectar errores, incluyendo el uso de tipos compuestos y NamedTuple. 'Funciones de Orden Superior': Funciones que aceptan otras funciones como parámetros, facilitando la manipulación flexible de datos.",
+        5: f"Genera ejercicios de programación en Python sobre el tema 'Secuencias'que cubran los siguientes conceptos fundamentales: Tipos de datos que permiten recorrer y acceder a sus elementos. Incluyen listas (mutables), tuplas (inmutables) y rangos (secuencias de números generadas de forma perezosa). 'Listas': Se crean con corchetes [], permiten modificar y almacenar elementos. Se pueden realizar operaciones como acceso, manipulación, y modificación de contenido. 'Tuplas': Se crean con paréntesis (), son inmutables y se utilizan para almacenar datos heterogéneos. NamedTuple permite nombrar campos para mejorar la legibilidad. 'Comprensión de Listas': Sintaxis especial para crear listas aplicando una operación a cada elemento de una secuencia. 'Unpacking': Proceso de descomponer secuencias en variables individuales, útil para recoger valores devueltos por funciones. 'Operadores sobre Secuencias': Incluyen pertenencia (in, not in), concatenación (+), y replicación (*). 'Slicing': Permite extraer sub-secuencias usando :, especificando límites y pasos para seleccionar partes específicas de una secuencia. Estos conceptos facilitan la manipulación y manejo eficiente de datos en Python.",
+        6: f"Genera ejercicios de programación en Python sobre el tema 'Conjuntos y Diccionarios' que cubran los siguientes conceptos fundamentales: Características como ser mutables, sin duplicados y sin posición fija. Inicialización usando llaves {{}} o set(), eliminando duplicados de secuencias. Operaciones como unión, intersección, diferencia, diferencia simétrica, y verificación de pertenencia. 'Diccionarios': Definición como contenedores que indexan valores mediante claves explícitas (no numéricas). Características como ser mutables, con valores de cualquier tipo y claves inmutables (cadenas, números, tuplas). Inicialización vacía con {{}} o dict(), con tuplas, parámetros, zip, o llaves directas. Operaciones de acceso, adición/modificación, actualización, eliminación, obtener claves/valores, y consultar pertenencia. Recorrido iterando sobre claves, valores, o pares clave-valor. Definición por comprensión usando {{clave: valor for item in iterable}}. 'Tipos Especiales': Counter para conteos con valores enteros, permite contar, actualizar, sumar conteos y obtener elementos más comunes. defaultdict para proporcionar un valor por defecto para claves inexistentes.",
+
+    }
+
+    # Combina la explicación del nivel de dificultad con el prompt del tema
+    prompt = f" {topic_prompts.get(topic)}{difficulty_explanation[difficulty]}"
+    
+    # Añadir la instrucción para incluir "Código de la solución:" antes de la solución
+    prompt += " Después del enunciado, proporcione la solución en formato de código. Asegúrese de incluir 'Solución:' antes del código de la solución, ya que lo necesito en dicho formato"
+    prompt += " Evita ejercicios repetidos o muy comunes. Asegúrate de que la solución sea completa, correcta y esté bien estructurada, evitando errores de sintaxis o lógica."
+
+    return prompt
+
+
+def parse_generated_text(generated_text):
+    solution_split_keyword = "Solución:"
+    if solution_split_keyword in generated_text:
+        parts = generated_text.split(solution_split_keyword)
+        statement = parts[0].strip()
+        solution = parts[1].strip() if len(parts) > 1 else ""
+    else:
+        statement = generated_text.strip()
+        solution = ""  
+
+    return statement, solution
+
+
+def save_exercises(exercises):
+    """Guarda los ejercicios con un único bulk_create y rellena su html_content."""
+    with transaction.atomic():
+        exercises = Exercise.objects.bulk_create(exercises)
+        for exercise in exercises:
+            exercise.html_content = exercise.build_html_content()
+        Exercise.objects.bulk_update(exercises, ['html_content'])
+    return exercises
+
+
+def generate_exercise_set(student, set_name, topic, difficulty, number_of_exercises):
+    exercise_set = ExerciseSet.objects.create(student=student, name=set_name)
+
+    # Todas las completions del conjunto se lanzan a la vez
+    prompts = [generate_prompt(topic, difficulty) for _ in range(number_of_exercises)]
+    generated_texts = llm.complete_prompts(prompts)
+
+    exercises = []
+    for generated_text in generated_texts:
+        statement, solution = parse_generated_text(generated_text)
+        exercises.append(Exercise(
+            exercise_set=exercise_set,
+            student=student,
+            statement=statement,
+            solution=solution,
+            difficulty=difficulty,
+            topic=topic
+        ))
+    save_exercises(exercises)
+
+    return exercise_set
+
+
+def generate_exam(student, exam_name, topics):
+    """Genera un examen de cuatro ejercicios, uno por cada tema de `topics`."""
+    exercise_configs = [
+        {'difficulty': 'Easy', 'topic': topics[0]},
+        {'difficulty': 'Easy', 'topic': topics[1]},
+        {'difficulty': 'Medium', 'topic': topics[2]},
+        {'difficulty': 'Hard', 'topic': topics[3]}
+    ]
+
+    prompts = [generate_prompt(config['topic'], config['difficulty']) for config in exercise_configs]
+    generated_texts = llm.chat_prompts(EXAM_SYSTEM_PROMPT, prompts, max_tokens=500, temperature=0.7)
+
+    exam = Exam.objects.create(student=student, name=exam_name)
+    exercise_set = ExerciseSet.objects.create(student=student, name=exam_name)
+
+    exercises = []
+    for config, generated_text in zip(exercise_configs, generated_texts):
+        statement, solution = parse_generated_text(generated_text)
+        exercises.append(Exercise(
+            student=student,
+            statement=statement,
+            solution=solution,
+            difficulty=config['difficulty'],
+            topic=config['topic'],
+            exercise_set=exercise_set
+        ))
+    exam.exercises.add(*save_exercises(exercises))
+
+    return exam
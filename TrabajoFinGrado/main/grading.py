@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import llm
+from .models import Exercise
+
+
+GRADING_SYSTEM_PROMPT = "Eres un asistente educativo que tiene que evaluar el resultado un ejercicio dado el enunciado de un ejercicio, la solución que ha proporcionado el alumno y la solución que ha generado una IA como posible solución del ejercicio."
+
+# Puntuación de cada ejercicio según su posición en el examen
+EXERCISE_SCORES = (1.5, 1.5, 2.75, 4.25)
+
+
+def build_grading_prompt(exercise, student_solution):
+    return f"""Estoy haciendo ejercicios de un examen y quiero evaluar la solución del siguiente ejercicio:
+            Enunciado del ejercicio:
+            {exercise.statement}
+            Solución del alumno:
+            {student_solution}
+            Solución esperada por el profesor:
+            {exercise.solution}
+            Responde únicamente con "correcto" o "incorrecto" en función de si el programa que
+            te he pasado es correcto o no respecto al enunciado que se propone y a la solución que se pide y dame
+            una breve explicación si es necesario para señalar los fallos o aciertos del código."""
+
+
+def grade_exam(exam, solutions):
+    """
+    Corrige todos los ejercicios del examen en paralelo y guarda el resultado.
+
+    `solutions` es un diccionario {exercise_id: solución del alumno}. Devuelve
+    la lista de ejercicios corregidos, en el orden del examen.
+    """
+    if exam.submission_time is None:
+        exam.submission_time = timezone.now()
+    exam.is_submitted = True
+
+    exercises = list(exam.exercises.all().order_by('exercise_id'))
+    positions = {exercise.exercise_id: index for index, exercise in enumerate(exercises)}
+
+    answered = [exercise for exercise in exercises if solutions.get(exercise.exercise_id)]
+    prompts = [build_grading_prompt(exercise, solutions[exercise.exercise_id]) for exercise in answered]
+    evaluations = dict(zip(
+        (exercise.exercise_id for exercise in answered),
+        llm.chat_prompts(GRADING_SYSTEM_PROMPT, prompts, max_tokens=150),
+    ))
+
+    for exercise in exercises:
+        evaluation = evaluations.get(exercise.exercise_id)
+        exercise.student_solution = solutions.get(exercise.exercise_id) or ""
+
+        if evaluation is not None and evaluation.lower().startswith("correcto"):
+            exercise.is_correct = True
+            position = positions[exercise.exercise_id]
+            if position < len(EXERCISE_SCORES):
+                exercise.score = EXERCISE_SCORES[position]
+        else:
+            exercise.is_correct = False
+            exercise.score = 0.0
+
+    exam.grade = sum(exercise.score for exercise in exercises if exercise.is_correct)
+
+    with transaction.atomic():
+        Exercise.objects.bulk_update(exercises, ['student_solution', 'is_correct', 'score'])
+        exam.save()
+
+    return exercises
@@ -0,0 +1,74 @@
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+# Versiones que se generan de cada imagen: nombre -> lado mayor en píxeles
+RENDITIONS = {
+    'thumbnail': 320,
+    'display': 1200,
+}
+
+# WebP para los navegadores que lo soportan y JPEG como alternativa
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def flatten(image):
+    """Pasa la imagen a RGB; la transparencia se rellena de blanco (JPEG no la admite)."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_renditions(image_field, prefix):
+    """
+    Genera las versiones reducidas de `image_field` en todos los formatos y las
+    guarda bajo `prefix`. Devuelve {nombre: {'width', 'height', formato: ruta}}.
+
+    La ruta incluye un hash del original para que cambiar la imagen cambie
+    también las URLs (y no se sirvan versiones antiguas cacheadas).
+    """
+    digest = hashlib.sha1(image_field.name.encode('utf-8')).hexdigest()[:10]
+
+    with image_field.open('rb') as original:
+        source = flatten(ImageOps.exif_transpose(Image.open(original)))
+
+    renditions = {}
+    for name, max_size in RENDITIONS.items():
+        image = source.copy()
+        # thumbnail() nunca amplía: las imágenes pequeñas se quedan como están
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+        rendition = {'width': image.width, 'height': image.height}
+        for fmt in FORMATS:
+            path = f"{prefix}/{digest}/{name}.{fmt}"
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            rendition[fmt] = default_storage.save(path, encode(image, fmt))
+        renditions[name] = rendition
+
+    return renditions
+
+
+def generate_forum_renditions(forum):
+    if not forum.image:
+        forum.image_renditions = {}
+    else:
+        forum.image_renditions = generate_renditions(forum.image, f"forum_images/renditions/{forum.pk}")
+    forum.save(update_fields=['image_renditions'])
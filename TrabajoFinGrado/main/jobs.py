@@ -0,0 +1,189 @@
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .generation import generate_exam, generate_exercise_set
+from .grading import grade_exam
+from .images import generate_forum_renditions
+from .models import Exam, Forum, Job, User
+
+logger = logging.getLogger(__name__)
+
+
+#~~~~~~~~TAREAS~~~~~~~~
+# Cada tarea recibe el usuario y el payload del Job y devuelve la URL a la que
+# hay que llevar al usuario cuando termine.
+
+def run_generate_exercises(user, payload):
+    exercise_set = generate_exercise_set(
+        student=user,
+        set_name=payload['set_name'],
+        topic=payload['topic'],
+        difficulty=payload['difficulty'],
+        number_of_exercises=payload['number_of_exercises'],
+    )
+    return reverse('exercise_set_detail', kwargs={'set_id': exercise_set.set_id})
+
+
+def run_generate_exam(user, payload):
+    exam = generate_exam(student=user, exam_name=payload['exam_name'], topics=payload['topics'])
+    return reverse('exam_detail', kwargs={'exam_id': exam.exam_id})
+
+
+def run_grade_exam(user, payload):
+    exam = Exam.objects.get(exam_id=payload['exam_id'], student=user)
+    # Las claves JSON siempre son cadenas
+    solutions = {int(exercise_id): solution for exercise_id, solution in payload['solutions'].items()}
+    grade_exam(exam, solutions)
+    return reverse('archived_exam', kwargs={'exam_id': exam.exam_id})
+
+
+def run_forum_image_renditions(user, payload):
+    forum = Forum.objects.get(pk=payload['forum_id'])
+    generate_forum_renditions(forum)
+    return reverse('view_forum', kwargs={'forum_id': forum.id})
+
+
+def fail_grade_exam(job):
+    # El examen vuelve a quedar sin entregar (con las respuestas ya guardadas en
+    # los ejercicios) para que el alumno pueda entregarlo otra vez
+    Exam.objects.filter(exam_id=job.payload['exam_id'], student_id=job.user_id).update(
+        is_submitted=False, submission_time=None,
+    )
+
+
+TASKS = {
+    'generate_exercises': run_generate_exercises,
+    'generate_exam': run_generate_exam,
+    'grade_exam': run_grade_exam,
+    'forum_image_renditions': run_forum_image_renditions,
+}
+
+# Qué hacer cuando una tarea falla definitivamente (después del último intento)
+ON_FAILURE = {
+    'grade_exam': fail_grade_exam,
+}
+
+
+#~~~~~~~~COLA~~~~~~~~
+
+def enqueue(kind, user, **payload):
+    """Crea un Job pendiente. Con JOBS_EAGER se ejecuta en el momento (útil en desarrollo y pruebas)."""
+    if kind not in TASKS:
+        raise ValueError(f"Tipo de tarea desconocido: {kind}")
+
+    job = Job.objects.create(user=user, kind=kind, payload=payload)
+    if getattr(settings, 'JOBS_EAGER', False):
+        run_job(job)
+    return job
+
+
+def retry_delay(attempts):
+    """Espera exponencial antes del siguiente intento: base, 2*base, 4*base..."""
+    base = getattr(settings, 'JOBS_RETRY_DELAY', 30)
+    return timezone.timedelta(seconds=base * 2 ** max(attempts - 1, 0))
+
+
+def requeue_stale_jobs():
+    """
+    Devuelve a PENDING los jobs en RUNNING cuyo heartbeat lleva más de
+    JOBS_RUNNING_TIMEOUT segundos sin renovarse: el worker que los reclamó se
+    ha caído sin terminarlos. Un job lento con el worker vivo no se toca.
+    """
+    deadline = timezone.now() - timezone.timedelta(seconds=getattr(settings, 'JOBS_RUNNING_TIMEOUT', 120))
+    requeued = Job.objects.filter(
+        Q(heartbeat_at__lt=deadline) | Q(heartbeat_at__isnull=True, started_at__lt=deadline),
+        status=Job.Status.RUNNING,
+    ).update(status=Job.Status.PENDING, started_at=None, heartbeat_at=None)
+    if requeued:
+        logger.warning("%s jobs sin terminar devueltos a la cola", requeued)
+    return requeued
+
+
+def claim_next_job():
+    """Marca como RUNNING el Job pendiente más antiguo que ya toca y lo devuelve (None si no hay)."""
+    requeue_stale_jobs()
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.PENDING, run_after__lte=now)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.Status.RUNNING
+        job.attempts += 1
+        job.started_at = job.heartbeat_at = now
+        job.save(update_fields=['status', 'attempts', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def renew_heartbeat(job):
+    """Renueva el heartbeat del job. Devuelve False si ya no está en RUNNING."""
+    return bool(Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING).update(heartbeat_at=timezone.now()))
+
+
+@contextmanager
+def heartbeat(job):
+    """
+    Renueva el heartbeat de `job` cada JOBS_HEARTBEAT_INTERVAL segundos desde
+    otro hilo mientras dura el bloque, para que un job lento no vuelva a la
+    cola y se ejecute dos veces.
+    """
+    interval = getattr(settings, 'JOBS_HEARTBEAT_INTERVAL', 30)
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    renew_heartbeat(job)
+                except Exception:
+                    logger.exception("Error renovando el heartbeat del job %s", job.job_id)
+        finally:
+            # El hilo usa su propia conexión a la BD
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    task = TASKS[job.kind]
+    try:
+        user = User.objects.get(pk=job.user_id)
+        job.result_url = task(user, job.payload)
+        job.status = Job.Status.DONE
+    except Exception:
+        logger.exception("Error ejecutando el job %s (intento %s)", job.job_id, job.attempts)
+        job.error = traceback.format_exc()
+        # Con JOBS_EAGER no hay worker que lo reintente
+        if job.attempts < getattr(settings, 'JOBS_MAX_ATTEMPTS', 3) and not getattr(settings, 'JOBS_EAGER', False):
+            job.status = Job.Status.PENDING
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+        else:
+            job.status = Job.Status.FAILED
+    if job.is_finished:
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result_url', 'error', 'finished_at', 'run_after'])
+
+    if job.status == Job.Status.FAILED and job.kind in ON_FAILURE:
+        try:
+            ON_FAILURE[job.kind](job)
+        except Exception:
+            logger.exception("Error tras el fallo del job %s", job.job_id)
+    return job
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+import openai
+
+openai.api_key = settings.OPENAI_API_KEY
+
+
+#~~~~~~~~BACKENDS~~~~~~~~
+
+class OpenAIBackend:
+    """Backend real: delega en la API de OpenAI."""
+
+    def completion(self, **kwargs):
+        response = openai.Completion.create(**kwargs)
+        return response['choices'][0]['text']
+
+    def chat_completion(self, **kwargs):
+        response = openai.ChatCompletion.create(**kwargs)
+        return response['choices'][0]['message']['content']
+
+    async def chat_stream(self, **kwargs):
+        """Generador asíncrono con los fragmentos de texto según los va generando el modelo."""
+        response = await openai.ChatCompletion.acreate(stream=True, **kwargs)
+        async for chunk in response:
+            token = chunk['choices'][0]['delta'].get('content')
+            if token:
+                yield token
+
+
+class FakeBackend:
+    """Backend local para pruebas: responde con un texto fijo tras una latencia simulada."""
+
+    def __init__(self, latency=0.0, completion_text=None, chat_text=None):
+        self.latency = latency
+        self.completion_text = completion_text or "Enunciado de prueba\nSolución:\nprint('hola')"
+        self.chat_text = chat_text or "correcto"
+
+    def completion(self, **kwargs):
+        time.sleep(self.latency)
+        return self.completion_text
+
+    def chat_completion(self, **kwargs):
+        time.sleep(self.latency)
+        return self.chat_text
+
+    async def chat_stream(self, **kwargs):
+        # La latencia se reparte entre las palabras de la respuesta
+        tokens = self.chat_text.split(' ')
+        for index, token in enumerate(tokens):
+            await asyncio.sleep(self.latency / len(tokens))
+            yield token if index == 0 else ' ' + token
+
+
+def get_backend():
+    """Devuelve el backend configurado en settings.LLM_BACKEND."""
+    backend_class = import_string(getattr(settings, 'LLM_BACKEND', 'main.llm.OpenAIBackend'))
+    return backend_class(**getattr(settings, 'LLM_BACKEND_OPTIONS', {}))
+
+
+#~~~~~~~~CONCURRENCIA~~~~~~~~
+
+# Un único pool por proceso: limita las llamadas simultáneas a la API
+# independientemente de cuántas peticiones estén generando a la vez.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'LLM_MAX_CONCURRENCY', 8),
+                    thread_name_prefix='llm',
+                )
+    return _executor
+
+
+def run_concurrently(func, items):
+    """Aplica func a cada elemento en el pool y devuelve los resultados en el mismo orden."""
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    futures = [_get_executor().submit(func, item) for item in items]
+    return [future.result() for future in futures]
+
+
+#~~~~~~~~GENERACIÓN~~~~~~~~
+
+def complete_prompts(prompts):
+    """Lanza una completion por prompt en paralelo y devuelve los textos generados."""
+    backend = get_backend()
+
+    def complete(prompt):
+        return backend.completion(
+            model="gpt-3.5-turbo-instruct",
+            prompt=prompt,
+            max_tokens=600,
+            temperature=1.0,
+            frequency_penalty=1.0,
+            presence_penalty=0.5,
+            n=1,
+            stop=None
+        ).strip()
+
+    return run_concurrently(complete, prompts)
+
+
+def chat_prompts(system_content, prompts, **kwargs):
+    """Lanza una chat completion por prompt en paralelo, todas con el mismo mensaje de sistema."""
+    backend = get_backend()
+
+    def complete(prompt):
+        return backend.chat_completion(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_content},
+                {"role": "user", "content": prompt}
+            ],
+            **kwargs
+        ).strip()
+
+    return run_concurrently(complete, prompts)
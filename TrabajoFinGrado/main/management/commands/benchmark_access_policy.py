@@ -0,0 +1,100 @@
+# main/management/commands/benchmark_access_policy.py
+
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse, resolve, Resolver404
+from main.middleware import AccessPolicy
+
+PATHS = [
+    '/', '/logout/', '/login/', '/register/student/', '/password_reset/', '/reset/abc/def/',
+    '/reset/done/', '/activate/abc/def/', '/pending-teacher/', '/rejected-teacher/',
+    '/user_profile/', '/profile/edit/', '/chat/', '/chat/3/', '/chat/archived/3/',
+    '/chats/archived/', '/exercises/', '/exam/4/', '/exam/4/archived/', '/students/7/',
+    '/forums/', '/forums/2/', '/calendar/', '/tema-3/', '/teachers/', '/jobs/5/',
+]
+
+USERS = [
+    SimpleNamespace(user_type='Teacher', verification_status='PENDING'),
+    SimpleNamespace(user_type='Teacher', verification_status='REJECTED'),
+    SimpleNamespace(user_type='Teacher', verification_status='APPROVED'),
+    SimpleNamespace(user_type='Student', verification_status='APPROVED'),
+]
+
+
+def legacy_is_allowed(user, path):
+    """Decisión de la antigua cadena de middlewares (Pending, Rejected, TeacherAccess, StudentRestriction)."""
+    if user.user_type == 'Teacher' and user.verification_status == 'PENDING':
+        if path not in [reverse('home'), reverse('pending_teacher'), reverse('logout')]:
+            return False
+
+    if user.user_type == 'Teacher' and user.verification_status == 'REJECTED':
+        if path not in [reverse('home'), reverse('rejected_teacher'), reverse('logout')]:
+            return False
+
+    allowed_teacher_paths = [
+        reverse('home'),
+        reverse('logout'),
+        reverse('rejected_teacher'),
+        reverse('pending_teacher'),
+        reverse('user_profile'),
+        reverse('edit_profile'),
+        reverse('archived_chat', kwargs={'chat_id': 1}),
+        reverse('archive_chat', kwargs={'chat_id': 1}),
+        reverse('archived_chats_list'),
+        reverse('archived_exam', kwargs={'exam_id': 1}),
+        reverse('student_detail', kwargs={'student_id': 1}),
+        reverse('forum_home'),
+        reverse('create_forum'),
+        reverse('view_forum', kwargs={'forum_id': 1}),
+        reverse('close_forum', kwargs={'forum_id': 1}),
+    ]
+    allowed_dynamic_paths = ['/chat/archived/', '/chat/archive/', '/exam/', '/students/', '/forums/']
+    if user.user_type == 'Teacher':
+        if path not in allowed_teacher_paths and not any(path.startswith(p) for p in allowed_dynamic_paths):
+            return False
+
+    if user.user_type == 'Student':
+        restricted_paths = [
+            'register', 'register_teacher', 'register_student',
+            'resend_activation_email', 'activation_resent',
+            'password_reset', 'password_reset_done',
+            'username_recovery', 'username_recovery_done',
+            'login', 'session_expired', 'rejected_teacher',
+            'pending_teacher'
+        ]
+        if any(path.lstrip('/').startswith(p) for p in restricted_paths):
+            return False
+        try:
+            if resolve(path).url_name in ['student_detail', 'activate', 'password_reset_confirm', 'password_reset_complete']:
+                return False
+        except Resolver404:
+            pass
+
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Compara el coste por petición de AccessPolicy con la antigua cadena de middlewares de acceso'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=200)
+
+    def handle(self, *args, **options):
+        policy = AccessPolicy()
+        cases = [(user, path) for user in USERS for path in PATHS]
+
+        # Antes de medir, se comprueba que ambas implementaciones deciden lo mismo
+        for user, path in cases:
+            if policy.is_allowed(user, path) != legacy_is_allowed(user, path):
+                raise CommandError(f'Decisión distinta para {user.user_type}/{user.verification_status} en {path}')
+
+        checks = len(cases) * options['rounds']
+        for name, is_allowed in [('cadena antigua', legacy_is_allowed), ('AccessPolicy', policy.is_allowed)]:
+            start = time.perf_counter()
+            for _ in range(options['rounds']):
+                for user, path in cases:
+                    is_allowed(user, path)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{name:<16} {elapsed * 1000:>9.1f} ms  ({elapsed / checks * 1e6:.2f} µs/petición)')
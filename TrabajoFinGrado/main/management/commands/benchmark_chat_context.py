@@ -0,0 +1,47 @@
+# main/management/commands/benchmark_chat_context.py
+
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from main.chat_context import build_chat_context
+from main.models import Chat, User
+
+class Command(BaseCommand):
+    help = 'Compara el tamaño del payload enviado al modelo con el historial completo según crece un chat (no deja datos en la BD)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=400, help='Número de turnos (pregunta + respuesta) a simular')
+        parser.add_argument('--every', type=int, default=50, help='Cada cuántos turnos se muestra una fila')
+
+    def handle(self, *args, **options):
+        message = "Tengo una duda con las listas por comprensión en Python. " * 8
+
+        self.stdout.write(f"{'turnos':>8} {'historial (bytes)':>18} {'payload máx. (bytes)':>21}")
+
+        # Resúmenes con el backend falso para no llamar a la API real
+        with override_settings(LLM_BACKEND='main.llm.FakeBackend', LLM_BACKEND_OPTIONS={'chat_text': 'Resumen ' * 200}):
+            with transaction.atomic():
+                student = User.objects.create(
+                    username='benchmark_chat_context',
+                    email='benchmark_chat_context@example.com',
+                    user_type=User.UserTypeChoices.STUDENT,
+                )
+                chat = Chat.objects.create(student=student)
+                history_size = 0
+                max_payload = 0
+
+                for turn in range(1, options['turns'] + 1):
+                    chat.add_message("user", message)
+                    payload = build_chat_context(chat)
+                    chat.add_message("assistant", message)
+                    history_size += 2 * len(json.dumps({"role": "user", "content": message}))
+                    max_payload = max(max_payload, len(json.dumps(payload)))
+
+                    # Se muestra el máximo del tramo porque el payload oscila entre resumen y resumen
+                    if turn % options['every'] == 0:
+                        self.stdout.write(f"{turn:>8} {history_size:>18} {max_payload:>21}")
+                        max_payload = 0
+
+                transaction.set_rollback(True)
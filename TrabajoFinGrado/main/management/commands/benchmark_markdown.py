@@ -0,0 +1,56 @@
+# main/management/commands/benchmark_markdown.py
+
+import time
+
+import markdown
+from django.core.management.base import BaseCommand
+from main.models import Exercise
+from main.rendering import MARKDOWN_EXTENSIONS, get_renderer, render_markdown
+
+SAMPLE_STATEMENT = """Escribe una función `contar_vocales(cadena)` que reciba una cadena y devuelva un diccionario con el número de apariciones de cada vocal.
+
+```python
+def contar_vocales(cadena):
+    ...
+```
+
+| Entrada | Salida |
+|---------|--------|
+| "hola"  | {'o': 1, 'a': 1} |
+"""
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark del renderizado Markdown sobre los enunciados de los ejercicios guardados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200, help='Número máximo de enunciados a usar')
+        parser.add_argument('--rounds', type=int, default=5, help='Veces que se renderiza el corpus completo')
+
+    def handle(self, *args, **options):
+        corpus = list(Exercise.objects.values_list('statement', flat=True)[:options['limit']])
+        if not corpus:
+            self.stdout.write('No hay ejercicios en la base de datos; se usa un enunciado de ejemplo.')
+            corpus = [SAMPLE_STATEMENT + f"\n<!-- {i} -->" for i in range(options['limit'])]
+
+        def fresh_instance(text):
+            return markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+
+        def shared_instance(text):
+            return get_renderer().reset().convert(text)
+
+        strategies = [
+            ('markdown.markdown() por llamada', fresh_instance),
+            ('instancia reutilizada por hilo', shared_instance),
+            ('render_markdown (instancia + caché LRU)', render_markdown),
+        ]
+
+        renders = len(corpus) * options['rounds']
+        self.stdout.write(f'{len(corpus)} enunciados x {options["rounds"]} rondas = {renders} renderizados')
+
+        for name, render in strategies:
+            start = time.perf_counter()
+            for _ in range(options['rounds']):
+                for text in corpus:
+                    render(text)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{name:<42} {elapsed * 1000:>9.1f} ms  ({elapsed / renders * 1e6:.0f} µs/render)')
@@ -0,0 +1,80 @@
+# main/management/commands/collect_media_garbage.py
+
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from main.models import Forum
+
+# Carpetas de MEDIA_ROOT cuyos ficheros solo se usan desde los modelos de abajo
+MANAGED_DIRS = ['forum_images']
+
+
+def reference_counts():
+    """Número de filas que apuntan a cada fichero (imagen original y sus versiones)."""
+    references = Counter()
+    for image, renditions in Forum.objects.exclude(image='').exclude(image__isnull=True).values_list('image', 'image_renditions'):
+        references[image] += 1
+        for rendition in (renditions or {}).values():
+            for key, value in rendition.items():
+                if key not in ('width', 'height'):
+                    references[value] += 1
+    return references
+
+
+def is_referenced(name):
+    """Comprueba en la BD si alguna fila apunta ahora mismo al fichero."""
+    return Forum.objects.filter(Q(image=name) | Q(image_renditions__icontains=name)).exists()
+
+
+class Command(BaseCommand):
+    help = 'Elimina de media/ los ficheros de imágenes que ya no referencia ningún foro'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra lo que se borraría')
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='No borra ficheros más recientes (subidas cuyo foro aún no se ha guardado)',
+        )
+
+    def handle(self, *args, **options):
+        references = reference_counts()
+        cutoff = time.time() - options['grace_minutes'] * 60
+        kept = deleted = freed = 0
+
+        for managed_dir in MANAGED_DIRS:
+            root = os.path.join(settings.MEDIA_ROOT, managed_dir)
+            # De abajo arriba para poder quitar las carpetas que se queden vacías
+            for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+                    if references[name] or os.path.getmtime(path) > cutoff:
+                        kept += 1
+                        continue
+
+                    # Las referencias se leyeron antes de recorrer la carpeta: justo
+                    # antes de borrar se comprueba de nuevo que nadie ha vuelto a
+                    # subir el fichero (mtime) ni lo ha enlazado desde un foro
+                    if os.path.getmtime(path) > cutoff or is_referenced(name):
+                        kept += 1
+                        continue
+
+                    freed += os.path.getsize(path)
+                    deleted += 1
+                    if options['dry_run']:
+                        self.stdout.write(f'Se borraría {name}')
+                    else:
+                        os.remove(path)
+
+                if not options['dry_run'] and dirpath != root and not os.listdir(dirpath):
+                    os.rmdir(dirpath)
+
+        verb = 'Se borrarían' if options['dry_run'] else 'Se han borrado'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} ficheros ({freed / 1024:.0f} KB); se conservan {kept}'
+        ))
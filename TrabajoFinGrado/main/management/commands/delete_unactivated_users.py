@@ -0,0 +1,47 @@
+# main/management/commands/delete_unactivated_users.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from main.models import User
+
+class Command(BaseCommand):
+    help = 'Elimina las cuentas que no se han activado en los 30 minutos siguientes al registro'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=30, help='Minutos que tiene un usuario para activar su cuenta')
+        parser.add_argument('--batch-size', type=int, default=100, help='Usuarios borrados por lote')
+        parser.add_argument('--pause', type=float, default=0.5, help='Segundos de espera entre lotes para no acaparar la BD')
+        parser.add_argument('--interval', type=int, default=0, help='Si se indica, repite el barrido cada N segundos')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            deleted = self.sweep(options['minutes'], options['batch_size'], options['pause'])
+            self.stdout.write(self.style.SUCCESS(f'Se han eliminado {deleted} usuarios sin activar'))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sweep(self, minutes, batch_size, pause):
+        expiration_time = timezone.now() - timezone.timedelta(minutes=minutes)
+        deleted = 0
+
+        while True:
+            # Usa el índice (is_active, created_at)
+            ids = list(
+                User.objects.filter(is_active=False, created_at__lt=expiration_time)
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+
+            User.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+
+            if len(ids) < batch_size:
+                return deleted
+            time.sleep(pause)
@@ -0,0 +1,27 @@
+# main/management/commands/generate_forum_renditions.py
+
+from django.core.management.base import BaseCommand
+from main.images import generate_forum_renditions
+from main.models import Forum
+
+class Command(BaseCommand):
+    help = 'Genera las versiones reducidas (WebP/JPEG) de las imágenes de los foros que aún no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenera también las de los foros que ya las tienen')
+
+    def handle(self, *args, **options):
+        forums = Forum.objects.exclude(image='').exclude(image__isnull=True).order_by('id')
+        if not options['all']:
+            forums = forums.filter(image_renditions={})
+
+        generated = 0
+        for forum in forums.iterator():
+            try:
+                generate_forum_renditions(forum)
+            except (OSError, ValueError) as e:
+                self.stderr.write(f'Foro {forum.id}: no se ha podido procesar {forum.image.name} ({e})')
+                continue
+            generated += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Se han generado las imágenes de {generated} foros'))
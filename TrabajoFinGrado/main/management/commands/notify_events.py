@@ -1,28 +1,29 @@
 # main/management/commands/notify_events.py
 
+from django.core.mail import get_connection
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.core.mail import send_mail
-from main.models import Event
+from main.reminders import REMINDER_LEAD, pending_reminders, send_reminders
 
 class Command(BaseCommand):
-    help = 'Envia notificaciones por correo 24 horas antes de los eventos programados'
+    help = 'Envia notificaciones por correo 24 horas antes de los eventos programados (ver también run_reminder_scheduler)'
 
-    def handle(self, *args, **kwargs):
-        now = timezone.now()
-        next_24_hours = now + timezone.timedelta(hours=24)
-        
-        # Buscar eventos que ocurran dentro de las próximas 24 horas
-        events = Event.objects.filter(start_time__gte=now, start_time__lte=next_24_hours)
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Correos enviados por lote')
 
-        for event in events:
-            user = event.user
-            # Enviar el correo de notificación
-            send_mail(
-                'Recordatorio: Evento en 24 horas',
-                f'Hola {user.username}, tienes el evento "{event.title}" en 24 horas.',
-                'saympl3xfp@gmail.com',  # Reemplazar con tu correo
-                [user.email],
-                fail_silently=False,
-            )
-            self.stdout.write(self.style.SUCCESS(f'Se ha enviado el correo a {user.email} para el evento "{event.title}"'))
+    def handle(self, *args, **options):
+        # Ocurrencias de las próximas 24 horas cuyo recordatorio no se ha enviado aún
+        occurrences = pending_reminders(timezone.now() + REMINDER_LEAD)
+        batch_size = options['batch_size']
+
+        sent = 0
+        # Una sola conexión SMTP (y un solo handshake TLS) para todos los lotes
+        connection = get_connection(fail_silently=False)
+        connection.open()
+        try:
+            for i in range(0, len(occurrences), batch_size):
+                sent += send_reminders(occurrences[i:i + batch_size], connection)
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Se han enviado {sent} recordatorios'))
@@ -0,0 +1,33 @@
+# main/management/commands/render_chat_messages.py
+
+from django.core.management.base import BaseCommand
+from main.models import ChatMessage
+from main.rendering import render_markdown
+
+class Command(BaseCommand):
+    help = 'Guarda el HTML renderizado de los mensajes del asistente que aún no lo tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Vuelve a renderizar también los mensajes que ya tienen HTML')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        messages = ChatMessage.objects.filter(role='assistant').only('message_id', 'content').order_by('message_id')
+        if not options['all']:
+            messages = messages.filter(html_content="")
+
+        batch = []
+        total = 0
+        for message in messages.iterator(chunk_size=options['batch_size']):
+            message.html_content = render_markdown(message.content)
+            batch.append(message)
+            if len(batch) >= options['batch_size']:
+                ChatMessage.objects.bulk_update(batch, ['html_content'])
+                total += len(batch)
+                batch = []
+
+        if batch:
+            ChatMessage.objects.bulk_update(batch, ['html_content'])
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Se han renderizado {total} mensajes'))
@@ -0,0 +1,34 @@
+# main/management/commands/run_jobs.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from main.jobs import claim_next_job, heartbeat, run_job
+
+class Command(BaseCommand):
+    help = 'Worker que ejecuta los jobs pendientes (generación de ejercicios/exámenes y corrección)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Procesa los jobs pendientes y termina')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Segundos de espera cuando la cola está vacía')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            with heartbeat(job):
+                run_job(job)
+            if job.status == job.Status.DONE:
+                self.stdout.write(self.style.SUCCESS(f'Job {job.job_id} ({job.kind}) completado'))
+            elif job.status == job.Status.PENDING:
+                self.stdout.write(self.style.WARNING(f'Job {job.job_id} ({job.kind}) ha fallado; se reintentará'))
+            else:
+                self.stdout.write(self.style.ERROR(f'Job {job.job_id} ({job.kind}) ha fallado'))
@@ -0,0 +1,152 @@
+# main/management/commands/run_reminder_scheduler.py
+
+import heapq
+import logging
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from main.models import Event
+from main.reminders import REMINDER_LEAD, pending_reminders, send_reminders
+
+logger = logging.getLogger(__name__)
+
+# Margen con el que se vuelven a leer los cambios de la pasada anterior: una
+# transacción puede confirmarse después de la consulta con un updated_at anterior
+REFRESH_OVERLAP = timezone.timedelta(minutes=1)
+
+
+class ReminderHeap:
+    """
+    Montículo de (momento del aviso, clave de la ocurrencia). La clave es
+    (id del evento, inicio original), así cada ocurrencia de una serie tiene su
+    aviso. Cuando una ocurrencia cambia de hora se añade otra entrada; las
+    antiguas se descartan al sacarlas porque ya no coinciden con `scheduled`.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self.scheduled = {}  # clave de la ocurrencia -> start_time programado
+
+    def __len__(self):
+        return len(self.scheduled)
+
+    def push(self, key, start_time, fire_at=None):
+        """Programa el aviso de `key` (por defecto REMINDER_LEAD antes de su inicio)."""
+        if self.scheduled.get(key) == start_time:
+            return False
+        self.scheduled[key] = start_time
+        heapq.heappush(self._heap, (fire_at or start_time - REMINDER_LEAD, key, start_time))
+        return True
+
+    def next_time(self):
+        while self._heap and self.scheduled.get(self._heap[0][1]) != self._heap[0][2]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Saca los avisos que ya tocan. Devuelve {clave: start_time programado}."""
+        due = {}
+        while (next_time := self.next_time()) is not None and next_time <= now:
+            _, key, start_time = heapq.heappop(self._heap)
+            del self.scheduled[key]
+            due[key] = start_time
+        return due
+
+
+class Command(BaseCommand):
+    help = 'Demonio que envía cada recordatorio de evento 24 horas antes, una sola vez'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookahead', type=int, default=600, help='Segundos de recordatorios futuros que se cargan en memoria')
+        parser.add_argument('--refresh', type=int, default=60, help='Cada cuántos segundos se buscan eventos nuevos o movidos')
+        parser.add_argument('--batch-size', type=int, default=100, help='Correos enviados por lote')
+        parser.add_argument('--retry', type=int, default=60, help='Segundos de espera antes de reintentar un lote que ha fallado')
+        parser.add_argument('--once', action='store_true', help='Envía los recordatorios que ya tocan y termina')
+
+    def handle(self, *args, **options):
+        lookahead = timezone.timedelta(seconds=options['lookahead'])
+        retry_delay = timezone.timedelta(seconds=options['retry'])
+        heap = ReminderHeap()
+        next_refresh = timezone.now()
+        loaded_until = changed_since = None
+
+        while True:
+            now = timezone.now()
+            if now >= next_refresh:
+                close_old_connections()
+                until = now + REMINDER_LEAD + lookahead
+                try:
+                    added = self.refresh(heap, until, loaded_until, changed_since)
+                except Exception:
+                    # Se vuelve a intentar en la próxima pasada desde la misma marca
+                    logger.exception("Error cargando los recordatorios pendientes")
+                else:
+                    loaded_until, changed_since = until, now
+                    if added:
+                        self.stdout.write(f'{added} recordatorios programados ({len(heap)} en memoria)')
+                next_refresh = now + timezone.timedelta(seconds=options['refresh'])
+
+            due = heap.pop_due(now)
+            if due:
+                sent = self.fire(heap, due, options['batch_size'], retry_delay)
+                self.stdout.write(self.style.SUCCESS(f'Se han enviado {sent} recordatorios'))
+
+            if options['once']:
+                break
+
+            # Se duerme hasta el próximo aviso o la próxima actualización, lo que llegue antes
+            wake_at = min(filter(None, [heap.next_time(), next_refresh]))
+            time.sleep(max((wake_at - timezone.now()).total_seconds(), 0.1))
+
+    def refresh(self, heap, until, loaded_until=None, changed_since=None):
+        """
+        Carga en el montículo las ocurrencias sin avisar hasta `until`. La
+        primera pasada lee toda la ventana; las siguientes solo el tramo que ha
+        entrado en ella desde `loaded_until` y los eventos creados o modificados
+        (updated_at, que también cambia con sus excepciones) desde
+        `changed_since`, porque el resto ya está en memoria.
+        """
+        if loaded_until is None:
+            occurrences = pending_reminders(until)
+        else:
+            changed = Event.objects.filter(updated_at__gte=changed_since - REFRESH_OVERLAP)
+            occurrences = pending_reminders(until, events=changed) + pending_reminders(until, start=loaded_until)
+
+        added = 0
+        for occurrence in occurrences:
+            added += heap.push((occurrence.id, occurrence.original_start), occurrence.start_time)
+        return added
+
+    def fire(self, heap, due, batch_size, retry_delay):
+        """
+        Envía los avisos de `due` ({clave: start_time}) por lotes. Si un lote
+        falla (SMTP o BD) se registra el error, sus ocurrencias quedan sin marcar
+        y se vuelven a programar dentro de `retry_delay`.
+        """
+        sent = 0
+        keys = list(due)
+        for i in range(0, len(keys), batch_size):
+            batch = set(keys[i:i + batch_size])
+            try:
+                # Se vuelve a comprobar en la BD: el evento puede haberse borrado,
+                # movido o avisado desde otro proceso desde que se cargó
+                events = Event.objects.filter(pk__in={event_id for event_id, _ in batch})
+                occurrences = [
+                    occurrence
+                    for occurrence in pending_reminders(timezone.now() + REMINDER_LEAD, events=events)
+                    if (occurrence.id, occurrence.original_start) in batch
+                ]
+                connection = get_connection(fail_silently=False)
+                try:
+                    sent += send_reminders(occurrences, connection)
+                finally:
+                    connection.close()
+            except Exception:
+                logger.exception("Error enviando %s recordatorios; se reintentarán", len(batch))
+                retry_at = timezone.now() + retry_delay
+                for key in batch:
+                    heap.push(key, due[key], fire_at=retry_at)
+        return sent
@@ -0,0 +1,40 @@
+# main/management/commands/send_queued_mail.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from main.outbox import claim_due_emails, deliver, purge_old_emails
+
+# Cada cuánto se borran los correos antiguos de la bandeja de salida
+PURGE_INTERVAL = timezone.timedelta(hours=1)
+
+class Command(BaseCommand):
+    help = 'Worker que envía los correos de la bandeja de salida (activación, recuperación de cuenta...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Envía los correos pendientes y termina')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos de espera cuando no hay correos pendientes')
+        parser.add_argument('--batch-size', type=int, default=50, help='Correos enviados por cada conexión SMTP')
+
+    def handle(self, *args, **options):
+        next_purge = timezone.now()
+        while True:
+            close_old_connections()
+            if timezone.now() >= next_purge:
+                purged = purge_old_emails()
+                if purged:
+                    self.stdout.write(f'Borrados {purged} correos antiguos')
+                next_purge = timezone.now() + PURGE_INTERVAL
+
+            emails = claim_due_emails(options['batch_size'])
+
+            if not emails:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            sent = deliver(emails)
+            self.stdout.write(self.style.SUCCESS(f'Enviados {sent} de {len(emails)} correos'))
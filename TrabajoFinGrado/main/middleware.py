@@ -2,8 +2,7 @@ from django.utils import timezone
 from datetime import timedelta
 from django.conf import settings
 from django.contrib.auth import logout
-from .views import delete_unactivated_users
-from django.urls import reverse, NoReverseMatch, resolve
+from django.urls import get_resolver, URLResolver
 from django.shortcuts import redirect
 
 
@@ -20,136 +19,124 @@ class SessionTimeoutMiddleware:
                 request.session['last_activity'] = now.isoformat()
             else:
                 last_activity_time = timezone.datetime.fromisoformat(last_activity)
+                inactive_time = now - last_activity_time
 
-                if now - last_activity_time > timedelta(seconds=settings.SESSION_COOKIE_AGE):
+                if inactive_time > timedelta(seconds=settings.SESSION_COOKIE_AGE):
                     logout(request)
                     request.session['session_expired'] = True  
-                else:
+                elif inactive_time > timedelta(seconds=settings.SESSION_ACTIVITY_GRANULARITY):
+                    # Solo se reescribe la sesión cuando la marca se ha quedado vieja,
+                    # no en cada petición
                     request.session['last_activity'] = now.isoformat()
 
         response = self.get_response(request)
         return response
 
 
-class CleanupMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+class AccessRule:
+    """Rutas exactas más prefijos; se comprueba con una búsqueda en un set y un único startswith."""
 
-    def __call__(self, request):
-        delete_unactivated_users()
-        response = self.get_response(request)
-        return response
+    def __init__(self, paths=(), prefixes=()):
+        self.paths = frozenset(paths)
+        self.prefixes = tuple(prefixes)
 
-class PendingTeacherMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+    def matches(self, path):
+        return path in self.paths or path.startswith(self.prefixes)
 
-    def __call__(self, request):
-        if request.user.is_authenticated:
-            if request.user.user_type == 'Teacher' and request.user.verification_status == 'PENDING':
-                allowed_paths = [
-                    reverse('home'),
-                    reverse('pending_teacher'),  
-                    reverse('logout'),  
-                ]
-
-                if request.path not in allowed_paths:
-                    return redirect('home')  
-        
-        response = self.get_response(request)
-        return response
 
-class RejectedTeacherMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+def url_name_rule(url_names, prefixes=()):
+    """
+    Regla con las rutas de los url_name indicados, sacadas de la URLconf: las
+    rutas sin parámetros se comparan exactas y las demás por su parte fija.
+    Los nombres se comparan completos, con su namespace ('admin:logout' no es 'logout').
+    """
+    paths, prefixes = [], list(prefixes)
 
-    def __call__(self, request):
-        if request.user.is_authenticated:
-            if request.user.user_type == 'Teacher' and request.user.verification_status == 'REJECTED':
-                allowed_paths = [
-                    reverse('home'),
-                    reverse('rejected_teacher'),  
-                    reverse('logout'),  
-                ]
-
-                if request.path not in allowed_paths:
-                    return redirect('home')  
-        
-        response = self.get_response(request)
-        return response
+    def walk(patterns, route_prefix, namespace):
+        for pattern in patterns:
+            route = route_prefix + str(pattern.pattern)
+            if isinstance(pattern, URLResolver):
+                if pattern.namespace:
+                    walk(pattern.url_patterns, route, f'{namespace}{pattern.namespace}:')
+                else:
+                    walk(pattern.url_patterns, route, namespace)
+            elif pattern.name and namespace + pattern.name in url_names:
+                if '<' in route:
+                    prefixes.append(route[:route.index('<')])
+                else:
+                    paths.append(route)
+
+    walk(get_resolver().url_patterns, '/', '')
+    return AccessRule(paths, prefixes)
+
+
+class AccessPolicy:
+    """
+    Reglas de acceso por tipo de usuario y estado de verificación, calculadas
+    una sola vez. Los profesores solo pueden entrar en las rutas de su regla y
+    los alumnos en cualquiera salvo las de la suya.
+    """
+
+    def __init__(self):
+        self.pending_teacher = url_name_rule({'home', 'pending_teacher', 'logout'})
+        self.rejected_teacher = url_name_rule({'home', 'rejected_teacher', 'logout'})
+        self.teacher = url_name_rule(
+            {
+                'home', 'logout', 'rejected_teacher', 'pending_teacher',
+                'user_profile', 'edit_profile', 'archived_chats_list',
+                'forum_home', 'create_forum',
+            },
+            prefixes=[
+                '/chat/archived/',
+                '/chat/archive/',
+                '/exam/',
+                '/students/',
+                '/forums/',
+            ],
+        )
+
+        student_restricted_paths = [
+            'register', 'register_teacher', 'register_student',
+            'resend_activation_email', 'activation_resent',
+            'password_reset', 'password_reset_done',
+            'username_recovery', 'username_recovery_done',
+            'login', 'session_expired', 'rejected_teacher',
+            'pending_teacher'
+        ]
+        self.student = url_name_rule(
+            {'student_detail', 'activate', 'password_reset_confirm', 'password_reset_complete'},
+            prefixes=[f'/{path}' for path in student_restricted_paths],
+        )
 
+    def is_allowed(self, user, path):
+        if user.user_type == 'Teacher':
+            if user.verification_status == 'PENDING':
+                return self.pending_teacher.matches(path)
+            if user.verification_status == 'REJECTED':
+                return self.rejected_teacher.matches(path)
+            return self.teacher.matches(path)
 
+        if user.user_type == 'Student':
+            return not self.student.matches(path)
 
-class TeacherAccessMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+        return True
 
-    def __call__(self, request):
-        allowed_teacher_paths = [
-            reverse('home'),
-            reverse('logout'),
-            reverse('rejected_teacher'),
-            reverse('pending_teacher'),
-            reverse('user_profile'),
-            reverse('edit_profile'),
-            reverse('archived_chat', kwargs={'chat_id': 1}),  
-            reverse('archive_chat', kwargs={'chat_id': 1}),
-            reverse('archived_chats_list'),
-            reverse('archived_exam', kwargs={'exam_id': 1}),
-            reverse('student_detail', kwargs={'student_id': 1}),
-            reverse('forum_home'),
-            reverse('create_forum'),
-            reverse('view_forum', kwargs={'forum_id': 1}),
-            reverse('close_forum', kwargs={'forum_id': 1}),
-        ]
-        
-        allowed_dynamic_paths = [
-            '/chat/archived/',
-            '/chat/archive/',
-            '/exam/',
-            '/students/',
-            '/forums/',
-        ]
-        
-        if request.user.is_authenticated and request.user.user_type == 'Teacher':
-            if (request.path not in allowed_teacher_paths and 
-                not any(request.path.startswith(dynamic_path) for dynamic_path in allowed_dynamic_paths)):
-                return redirect('home')  
-        
-        response = self.get_response(request)
-        return response
-    
 
+class AccessPolicyMiddleware:
+    """Restricciones de navegación de profesores (pendientes, rechazados, aprobados) y alumnos."""
 
-class StudentRestrictionMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
-        self.restricted_paths = [
-            'register', 'register_teacher', 'register_student',
-            'resend_activation_email', 'activation_resent',
-            'password_reset', 'password_reset_done',
-            'username_recovery', 'username_recovery_done',
-            'login', 'session_expired', 'rejected_teacher',
-            'pending_teacher'
-        ]
-        self.restricted_named_paths = [
-            'student_detail', 'activate', 'password_reset_confirm', 'password_reset_complete'
-        ]
+        self.policy = None
 
     def __call__(self, request):
-        path = request.path_info.lstrip('/')
-        
-        if request.user.is_authenticated and request.user.user_type == 'Student':
-            for restricted_path in self.restricted_paths:
-                if path.startswith(restricted_path):
-                    return redirect('home')
-
-            try:
-                resolved_url_name = resolve(request.path_info).url_name
-                if resolved_url_name in self.restricted_named_paths:
-                    return redirect('home')
-            except NoReverseMatch:
-                pass  
-        
+        if request.user.is_authenticated:
+            # Se compila en la primera petición, cuando la URLconf ya está cargada
+            if self.policy is None:
+                self.policy = AccessPolicy()
+
+            if not self.policy.is_allowed(request.user, request.path_info):
+                return redirect('home')
+
         response = self.get_response(request)
         return response
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+
+
+def copy_conversations_to_messages(apps, schema_editor):
+    """Convierte el JSON de Chat.conversation en filas de ChatMessage."""
+    Chat = apps.get_model('main', 'Chat')
+    ChatMessage = apps.get_model('main', 'ChatMessage')
+
+    for chat in Chat.objects.exclude(conversation="").only('chat_id', 'conversation').iterator():
+        try:
+            conversation = json.loads(chat.conversation)
+        except ValueError:
+            continue
+
+        ChatMessage.objects.bulk_create([
+            ChatMessage(
+                chat_id=chat.chat_id,
+                role=message.get('role', 'user'),
+                content=message.get('content', ''),
+                sequence=sequence,
+            )
+            for sequence, message in enumerate(conversation, start=1)
+        ])
+
+
+def copy_messages_to_conversations(apps, schema_editor):
+    Chat = apps.get_model('main', 'Chat')
+    ChatMessage = apps.get_model('main', 'ChatMessage')
+
+    for chat in Chat.objects.only('chat_id').iterator():
+        messages = ChatMessage.objects.filter(chat_id=chat.chat_id).order_by('sequence').values('role', 'content')
+        Chat.objects.filter(chat_id=chat.chat_id).update(conversation=json.dumps(list(messages)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('message_id', models.AutoField(primary_key=True, serialize=False)),
+                ('role', models.CharField(max_length=20)),
+                ('content', models.TextField()),
+                ('sequence', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='main.chat')),
+            ],
+            options={
+                'ordering': ['sequence'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='chatmessage',
+            constraint=models.UniqueConstraint(fields=('chat', 'sequence'), name='unique_chat_message_sequence'),
+        ),
+        migrations.RunPython(copy_conversations_to_messages, copy_messages_to_conversations),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_remove_chat_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='summary_upto',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
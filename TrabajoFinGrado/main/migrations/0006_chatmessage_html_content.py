@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_chat_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='html_content',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
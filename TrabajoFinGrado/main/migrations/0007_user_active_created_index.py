@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_chatmessage_html_content'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', 'created_at'], name='main_user_is_acti_665dfc_idx'),
+        ),
+    ]
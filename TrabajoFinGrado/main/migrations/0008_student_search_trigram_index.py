@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+# Solo en PostgreSQL: en SQLite (pruebas) la búsqueda funciona sin índice.
+CREATE_INDEX = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS main_user_student_search_trgm
+    ON main_user USING gin (
+        username gin_trgm_ops,
+        first_name gin_trgm_ops,
+        last_name gin_trgm_ops,
+        email gin_trgm_ops
+    )
+    WHERE user_type = 'Student';
+"""
+
+DROP_INDEX = "DROP INDEX IF EXISTS main_user_student_search_trgm;"
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_user_active_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_student_search_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='grade',
+            field=models.FloatField(default=0.0),
+        ),
+    ]
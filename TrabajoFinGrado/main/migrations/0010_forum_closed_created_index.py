@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_exam_grade'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forum',
+            index=models.Index(fields=['is_closed', '-created_at'], name='main_forum_closed_created_idx'),
+        ),
+    ]
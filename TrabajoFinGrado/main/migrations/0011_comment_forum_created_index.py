@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_forum_closed_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['forum', 'created_at'], name='main_comment_forum_created_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_comment_forum_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forum',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
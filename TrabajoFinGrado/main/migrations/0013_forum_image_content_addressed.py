@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:42
+
+from django.db import migrations, models
+import main.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_forum_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='forum',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=main.storage.ContentAddressedStorage(), upload_to='forum_images/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_forum_image_content_addressed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='reminded_start_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
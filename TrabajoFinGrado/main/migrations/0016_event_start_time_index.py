@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['start_time'], name='main_event_start_time_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_event_updated_at_user_start_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='recurrence',
+            field=models.CharField(blank=True, choices=[('', 'No se repite'), ('DAILY', 'Cada día'), ('WEEKLY', 'Cada semana'), ('MONTHLY', 'Cada mes')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_interval',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_until',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='EventException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField()),
+                ('is_cancelled', models.BooleanField(default=False)),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('start_time', models.DateTimeField(blank=True, null=True)),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('color', models.CharField(blank=True, max_length=7)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='main.event')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='eventexception',
+            constraint=models.UniqueConstraint(fields=('event', 'original_start'), name='unique_event_exception_start'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+
+# icontains se compila en PostgreSQL como UPPER("campo"::text) LIKE UPPER(%s), así que
+# el índice de trigramas tiene que ser sobre esas mismas expresiones para que el
+# planificador lo use (el de 0008, sobre las columnas, no servía para la búsqueda).
+CREATE_INDEX = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+DROP INDEX IF EXISTS main_user_student_search_trgm;
+CREATE INDEX IF NOT EXISTS main_user_student_search_upper_trgm
+    ON main_user USING gin (
+        UPPER(username::text) gin_trgm_ops,
+        UPPER(first_name::text) gin_trgm_ops,
+        UPPER(last_name::text) gin_trgm_ops,
+        UPPER(email::text) gin_trgm_ops
+    )
+    WHERE user_type = 'Student';
+"""
+
+# Al deshacer se vuelve al índice de 0008_student_search_trigram_index
+DROP_INDEX = """
+DROP INDEX IF EXISTS main_user_student_search_upper_trgm;
+CREATE INDEX IF NOT EXISTS main_user_student_search_trgm
+    ON main_user USING gin (
+        username gin_trgm_ops,
+        first_name gin_trgm_ops,
+        last_name gin_trgm_ops,
+        email gin_trgm_ops
+    )
+    WHERE user_type = 'Student';
+"""
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_event_recurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+
+
+BATCH_SIZE = 500
+
+
+def backfill_exam_grades(apps, schema_editor):
+    """Guarda en Exam.grade la nota de los exámenes entregados antes de 0009_exam_grade."""
+    Exam = apps.get_model('main', 'Exam')
+    exams = (
+        Exam.objects.filter(is_submitted=True)
+        .annotate(computed_grade=Coalesce(
+            Sum('exercises__score', filter=Q(exercises__is_correct=True)),
+            0.0,
+            output_field=models.FloatField(),
+        ))
+        .order_by('exam_id')
+    )
+
+    last_id = 0
+    while True:
+        # Paginación por exam_id para no cargar todos los exámenes a la vez
+        batch = list(exams.filter(exam_id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+
+        changed = [exam for exam in batch if exam.grade != exam.computed_grade]
+        for exam in changed:
+            exam.grade = exam.computed_grade
+        Exam.objects.bulk_update(changed, ['grade'])
+        last_id = batch[-1].exam_id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_student_search_upper_trigram_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_exam_grades, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_backfill_exam_grade'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['updated_at'], name='main_event_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_event_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField()),
+                ('start_time', models.DateTimeField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='main.event')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='eventreminder',
+            constraint=models.UniqueConstraint(fields=('event', 'original_start'), name='unique_event_reminder_start'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_job_retries_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['forum', 'id'], name='main_comment_forum_id_idx'),
+        ),
+    ]
@@ -1,11 +1,13 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
-from django.db.models import Q
-import json
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch, Q
 from datetime import datetime, timedelta
 from django.utils import timezone
-import markdown
 from django.utils.safestring import mark_safe
+from .rendering import render_markdown
+from .storage import ContentAddressedStorage
 
 class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True) 
@@ -52,6 +54,12 @@ class User(AbstractUser):
         verbose_name='user permissions',
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Para el barrido de cuentas sin activar (delete_unactivated_users)
+            models.Index(fields=['is_active', 'created_at']),
+        ]
+
     @property
     def is_teacher(self):
         return self.user_type == "Teacher"
@@ -94,10 +102,11 @@ class Exercise(models.Model):
 
     def statement_as_html(self):
         """Convierte el enunciado Markdown a HTML cuando se solicite."""
-        return mark_safe(markdown.markdown(self.statement, extensions=['fenced_code', 'codehilite', 'extra']))
+        return render_markdown(self.statement)
     
-    def generate_html_content(self):
-        self.html_content = f"""
+    def build_html_content(self):
+        """Construye el HTML del ejercicio sin guardarlo (necesita exercise_id)."""
+        return f"""
         <div class="exercise">
             <h3>Ejercicio {self.exercise_id}</h3>
             <p>{self.statement}</p>
@@ -112,11 +121,18 @@ class Exercise(models.Model):
             </div>
         </div>
         """
-        self.save()
 
     def __str__(self):
         return f"Exercise {self.exercise_id} - {self.difficulty} - Tema {self.topic}"
 
+class ExamQuerySet(models.QuerySet):
+    def with_exercises(self):
+        """Carga los ejercicios de cada examen en una sola consulta, en `exercise_list` y ordenados por id."""
+        return self.prefetch_related(
+            Prefetch('exercises', queryset=Exercise.objects.order_by('exercise_id'), to_attr='exercise_list')
+        )
+
+
 class Exam(models.Model):
     exam_id = models.AutoField(primary_key=True)
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exams', limit_choices_to=Q(user_type='Student'))
@@ -126,10 +142,9 @@ class Exam(models.Model):
     is_submitted = models.BooleanField(default=False)
     exercises = models.ManyToManyField('Exercise', related_name='exams')
     created_at = models.DateTimeField(auto_now_add=True)  # Campo para la fecha de creación
+    grade = models.FloatField(default=0.0)  # Se guarda al corregir el examen
 
-    @property
-    def grade(self):
-        return sum(exercise.score for exercise in self.exercises.all() if exercise.is_correct)
+    objects = ExamQuerySet.as_manager()
 
     @property
     def is_time_over(self):
@@ -140,54 +155,167 @@ class Chat(models.Model):
     chat_id = models.AutoField(primary_key=True)
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chats', limit_choices_to=Q(user_type='Student'))
     url = models.URLField()
-    conversation = models.TextField(default="")
     is_archived = models.BooleanField(default=False)
     last_activity = models.DateTimeField(auto_now=True)  # Se actualiza con cada mensaje nuevo
+    summary = models.TextField(blank=True, default="")  # Resumen de los mensajes antiguos que se envía al modelo
+    summary_upto = models.PositiveIntegerField(default=0)  # Secuencia del último mensaje incluido en el resumen
 
     def add_message(self, role, content):
-        # Cargar la conversación existente
-        if self.conversation:
-            convo = json.loads(self.conversation)
-        else:
-            convo = []
-    
-        # Imprimir la conversación antes de agregar el nuevo mensaje
-        print(f"Conversation before adding new message: {convo}")
-    
-        convo.append({"role": role, "content": content})
-    
-        # Convertir de nuevo la lista a JSON y guardar en la conversación
-        self.conversation = json.dumps(convo)
-    
-        # Imprimir la conversación después de agregar el nuevo mensaje
-        print(f"Updated conversation: {self.conversation}")
-    
-        # Actualizar la última actividad
-        self.last_activity = datetime.now()
-    
-        # Guardar el modelo para persistir los cambios
-        self.save()
+        """
+        Añade un mensaje como una fila nueva: un INSERT pequeño, sin reescribir el historial.
+        Lanza Chat.DoesNotExist si el chat se ha borrado.
+        """
+        html_content = render_markdown(content) if role == 'assistant' else ""
+        with transaction.atomic():
+            # Actualizar la última actividad bloquea la fila del chat hasta el final de la
+            # transacción, así que los mensajes simultáneos se asignan la secuencia de uno en uno
+            self.last_activity = timezone.now()
+            if not Chat.objects.filter(pk=self.pk).update(last_activity=self.last_activity):
+                raise Chat.DoesNotExist(f"El chat {self.pk} no existe.")
+            last_sequence = self.messages.aggregate(last=models.Max('sequence'))['last'] or 0
+            return ChatMessage.objects.create(
+                chat=self,
+                role=role,
+                content=content,
+                html_content=html_content,
+                sequence=last_sequence + 1,
+            )
+
+    def get_messages(self, before=None, limit=None):
+        """
+        Devuelve los `limit` (CHAT_PAGE_SIZE) mensajes más recientes anteriores a
+        la secuencia `before` (en orden cronológico) y si quedan mensajes más antiguos.
+        """
+        limit = limit or getattr(settings, 'CHAT_PAGE_SIZE', 50)
+        messages = self.messages.order_by('-sequence')
+        if before is not None:
+            messages = messages.filter(sequence__lt=before)
+        page = list(messages[:limit + 1])
+        has_more = len(page) > limit
+        return page[:limit][::-1], has_more
+
+    def __str__(self):
+        return f"Chat with {self.student.username}"
+
 
+class ChatMessage(models.Model):
+    message_id = models.AutoField(primary_key=True)
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='messages')
+    role = models.CharField(max_length=20)
+    content = models.TextField()
+    html_content = models.TextField(blank=True, default="")  # Markdown ya renderizado (solo mensajes del asistente)
+    sequence = models.PositiveIntegerField()  # Posición del mensaje dentro del chat
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['chat', 'sequence'], name='unique_chat_message_sequence'),
+        ]
 
-    def get_conversation(self):
-        if self.conversation:
-            return json.loads(self.conversation)
-        return []
+    def get_html(self):
+        """HTML del mensaje; si aún no se ha renderizado (mensajes antiguos) se calcula al vuelo."""
+        if self.html_content:
+            return mark_safe(self.html_content)
+        return render_markdown(self.content)
 
     def __str__(self):
-        return f"Chat with {self.student.username}"
-    
+        return f"Message {self.sequence} ({self.role}) in chat {self.chat_id}"
+
 
 class Event(models.Model):
+    class Recurrence(models.TextChoices):
+        NONE = '', 'No se repite'
+        DAILY = 'DAILY', 'Cada día'
+        WEEKLY = 'WEEKLY', 'Cada semana'
+        MONTHLY = 'MONTHLY', 'Cada mes'
+
     title = models.CharField(max_length=200)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     color = models.CharField(max_length=7, default='#000000')  # Campo para el color del evento
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='events')  # Relación con el usuario
+    # start_time para el que ya se envió el recordatorio; si el evento se mueve deja de coincidir y se vuelve a avisar
+    reminded_start_time = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Last-Modified del feed del calendario
+    # Regla de repetición: start_time/end_time son la primera ocurrencia y las
+    # demás se calculan al pedirlas (main.recurrence), no se guardan
+    recurrence = models.CharField(max_length=10, choices=Recurrence.choices, default=Recurrence.NONE, blank=True)
+    recurrence_interval = models.PositiveSmallIntegerField(default=1)  # Cada cuántos días/semanas/meses
+    recurrence_until = models.DateField(null=True, blank=True)  # Último día (incluido); vacío = sin fin
+
+    class Meta:
+        indexes = [
+            # Búsqueda de recordatorios pendientes (main.reminders)
+            models.Index(fields=['start_time'], name='main_event_start_time_idx'),
+            # Rango de fechas que pide el calendario de cada usuario
+            models.Index(fields=['user', 'start_time'], name='main_event_user_start_idx'),
+            # Eventos creados o modificados desde la última pasada de run_reminder_scheduler
+            models.Index(fields=['updated_at'], name='main_event_updated_at_idx'),
+        ]
+
+    @property
+    def is_recurring(self):
+        return bool(self.recurrence)
 
     def __str__(self):
         return self.title
 
+
+class EventException(models.Model):
+    """Ocurrencia de un evento periódico que se ha cancelado o modificado."""
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='exceptions')
+    original_start = models.DateTimeField()  # Inicio que tendría la ocurrencia según la regla
+    is_cancelled = models.BooleanField(default=False)
+    # Valores que sustituyen a los del evento en esta ocurrencia (vacío = los del evento)
+    title = models.CharField(max_length=200, blank=True)
+    start_time = models.DateTimeField(null=True, blank=True)
+    end_time = models.DateTimeField(null=True, blank=True)
+    color = models.CharField(max_length=7, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'original_start'], name='unique_event_exception_start'),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.touch_event()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.touch_event()
+        return result
+
+    def touch_event(self):
+        # Cambia el ETag/Last-Modified del feed del calendario
+        Event.objects.filter(pk=self.event_id).update(updated_at=timezone.now())
+
+    def __str__(self):
+        return f"{self.event.title} - {self.original_start}"
+
+
+class EventReminder(models.Model):
+    """
+    Recordatorio enviado para una ocurrencia de un evento periódico (los
+    eventos normales lo guardan en Event.reminded_start_time).
+    """
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='reminders')
+    original_start = models.DateTimeField()  # Inicio que tendría la ocurrencia según la regla
+    # Inicio para el que se avisó; si la ocurrencia se mueve deja de coincidir y se vuelve a avisar
+    start_time = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'original_start'], name='unique_event_reminder_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.event.title} - {self.original_start}"
+
+
 class Forum(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -195,7 +323,54 @@ class Forum(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_closed = models.BooleanField(default=False)
     archived = models.BooleanField(default=False)
-    image = models.ImageField(upload_to='forum_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='forum_images/', storage=ContentAddressedStorage(), blank=True, null=True)
+    image_renditions = models.JSONField(default=dict, blank=True)  # Versiones reducidas de la imagen (main.images)
+
+    class Meta:
+        indexes = [
+            # Orden del índice de foros: abiertos primero y después por fecha
+            models.Index(fields=['is_closed', '-created_at'], name='main_forum_closed_created_idx'),
+        ]
+
+    @property
+    def image_rendition_urls(self):
+        """{nombre: {'width', 'height', 'webp', 'jpeg'}} con URLs; vacío mientras no se hayan generado."""
+        renditions = {}
+        for name, rendition in self.image_renditions.items():
+            renditions[name] = {
+                key: default_storage.url(value) if key in ('webp', 'jpeg') else value
+                for key, value in rendition.items()
+            }
+        return renditions
+
+    def get_comments(self, before=None, limit=None):
+        """
+        Devuelve los `limit` (FORUM_COMMENTS_PAGE_SIZE) comentarios más recientes
+        anteriores al comentario `before` (en orden cronológico, con su autor) y
+        si quedan más antiguos.
+
+        Igual que en get_comments_after se compara solo el id, así que no
+        importa que el comentario `before` se haya borrado.
+        """
+        limit = limit or getattr(settings, 'FORUM_COMMENTS_PAGE_SIZE', 50)
+        comments = self.comments.select_related('user').order_by('-id')
+        if before is not None:
+            comments = comments.filter(id__lt=before)
+        page = list(comments[:limit + 1])
+        has_more = len(page) > limit
+        return page[:limit][::-1], has_more
+
+    def get_comments_after(self, after, limit=None):
+        """
+        Comentarios publicados después del comentario `after`, en orden cronológico.
+
+        Se compara solo el id (los comentarios nuevos siempre tienen uno mayor),
+        así que after=0 (debate sin comentarios) devuelve los primeros y no
+        importa que el comentario `after` se haya borrado.
+        """
+        limit = limit or getattr(settings, 'FORUM_COMMENTS_PAGE_SIZE', 50)
+        comments = self.comments.select_related('user').filter(id__gt=after).order_by('id')
+        return list(comments[:limit])
 
     def __str__(self):
         return self.title
@@ -206,5 +381,75 @@ class Comment(models.Model):
     content = models.TextField(max_length=3000)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['forum', 'created_at'], name='main_comment_forum_created_idx'),
+            # Páginas de comentarios de un debate (get_comments y get_comments_after)
+            models.Index(fields=['forum', 'id'], name='main_comment_forum_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'Comment by {self.user.username} on {self.forum.title}'
+
+
+class Job(models.Model):
+    """Tarea pesada (llamadas al modelo) que se ejecuta fuera de la petición."""
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    job_id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    result_url = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)  # No se reclama antes (espera entre reintentos)
+    # Lo renueva el worker mientras ejecuta el job; si deja de hacerlo, el job vuelve a la cola
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+    def __str__(self):
+        return f"Job {self.job_id} - {self.kind} - {self.status}"
+
+
+class OutgoingEmail(models.Model):
+    """Correo pendiente de envío; lo manda el worker `send_queued_mail` (ver main.outbox)."""
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        SENT = 'SENT', 'Sent'
+        FAILED = 'FAILED', 'Failed'
+
+    email_id = models.AutoField(primary_key=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)  # Vacío: DEFAULT_FROM_EMAIL
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
     def __str__(self):
-        return f'Comment by {self.user.username} on {self.forum.title}'
\ No newline at end of file
+        return f"Email {self.email_id} - {self.subject} - {self.status}"
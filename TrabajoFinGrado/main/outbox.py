@@ -0,0 +1,114 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+# Tiempo que un worker se reserva un correo; si muere sin terminar, pasado
+# este plazo otro worker lo vuelve a intentar
+CLAIM_TIMEOUT = timezone.timedelta(minutes=5)
+
+
+def queue_email(subject, body, to, from_email=None, html_body=''):
+    """
+    Guarda el correo en la bandeja de salida en lugar de enviarlo, para que la
+    petición no espere al servidor SMTP. Con EMAIL_OUTBOX_EAGER se envía en el
+    momento (útil en desarrollo sin worker).
+    """
+    email = OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or '',
+        to=list(to),
+    )
+    if getattr(settings, 'EMAIL_OUTBOX_EAGER', False):
+        transaction.on_commit(lambda: deliver([email]))
+    return email
+
+
+def retry_delay(attempts):
+    """Espera exponencial antes del siguiente intento: base, 2*base, 4*base... con un máximo de un día."""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60)
+    return timezone.timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 24 * 60 * 60))
+
+
+def claim_due_emails(limit):
+    """Reserva hasta `limit` correos pendientes cuyo siguiente intento ya toca."""
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.Status.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:limit]
+        )
+        for email in emails:
+            email.attempts += 1
+            email.next_attempt_at = now + CLAIM_TIMEOUT
+        OutgoingEmail.objects.bulk_update(emails, ['attempts', 'next_attempt_at'])
+    return emails
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject, email.body, email.from_email or None, email.to, connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def deliver(emails):
+    """Envía los correos por una misma conexión SMTP y guarda el resultado de cada uno. Devuelve cuántos se enviaron."""
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6)
+    sent = 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for email in emails:
+            try:
+                build_message(email, connection).send()
+            except Exception as e:
+                logger.warning("Error enviando el correo %s (intento %s): %s", email.email_id, email.attempts, e)
+                email.last_error = str(e)
+                if email.attempts >= max_attempts:
+                    email.status = OutgoingEmail.Status.FAILED
+                else:
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+            else:
+                email.status = OutgoingEmail.Status.SENT
+                email.sent_at = timezone.now()
+                # El contenido ya no hace falta y puede llevar enlaces de activación
+                # o de recuperación de la cuenta: no se guarda
+                email.body = email.html_body = ''
+                sent += 1
+    except Exception as e:
+        # No se ha podido ni abrir la conexión: todos vuelven a la cola
+        logger.warning("No se ha podido conectar con el servidor de correo: %s", e)
+        for email in emails:
+            if email.status == OutgoingEmail.Status.PENDING:
+                email.last_error = str(e)
+                if email.attempts >= max_attempts:
+                    email.status = OutgoingEmail.Status.FAILED
+                else:
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    finally:
+        connection.close()
+
+    OutgoingEmail.objects.bulk_update(emails, ['status', 'next_attempt_at', 'last_error', 'sent_at', 'body', 'html_body'])
+    return sent
+
+
+def purge_old_emails():
+    """Borra los correos enviados o fallidos de hace más de EMAIL_OUTBOX_RETENTION_DAYS días. Devuelve cuántos."""
+    cutoff = timezone.now() - timezone.timedelta(days=getattr(settings, 'EMAIL_OUTBOX_RETENTION_DAYS', 7))
+    deleted, _ = OutgoingEmail.objects.filter(
+        status__in=[OutgoingEmail.Status.SENT, OutgoingEmail.Status.FAILED], created_at__lt=cutoff,
+    ).delete()
+    return deleted
@@ -0,0 +1,203 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Event, EventException
+
+
+class Occurrence:
+    """Una aparición concreta de un evento (el propio evento si no se repite)."""
+
+    def __init__(self, event, original_start, exception=None):
+        duration = event.end_time - event.start_time
+        self.event = event
+        self.id = event.id
+        self.original_start = original_start
+        self.is_recurring = event.is_recurring
+        self.title = event.title
+        self.start_time = original_start
+        self.end_time = original_start + duration
+        self.color = event.color
+
+        if exception is not None:
+            self.title = exception.title or self.title
+            self.start_time = exception.start_time or self.start_time
+            self.end_time = exception.end_time or self.end_time
+            self.color = exception.color or self.color
+
+    @property
+    def occurrence_key(self):
+        """Identifica la ocurrencia dentro de la serie (vacío si el evento no se repite)."""
+        return timezone.localtime(self.original_start).isoformat() if self.is_recurring else ''
+
+    def overlaps(self, start, end):
+        return (end is None or self.start_time < end) and (start is None or self.end_time > start)
+
+
+def add_months(value, months):
+    """Suma meses a una fecha sin zona horaria; None si ese día no existe en el mes (p. ej. 31 de abril)."""
+    month_index = value.month - 1 + months
+    try:
+        return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1)
+    except ValueError:
+        return None
+
+
+def iter_starts(event, window_start, window_end):
+    """
+    Genera los inicios de las ocurrencias de la regla que se solapan con
+    [window_start, window_end). Salta directamente a la primera ocurrencia
+    del rango en lugar de recorrer la serie desde el principio.
+
+    Las fechas se calculan en hora local para que una clase semanal a las
+    10:00 siga a las 10:00 después de un cambio de horario.
+    """
+    tz = timezone.get_current_timezone()
+    first = timezone.localtime(event.start_time, tz).replace(tzinfo=None)
+    duration = event.end_time - event.start_time
+    interval = max(event.recurrence_interval, 1)
+    until = datetime.combine(event.recurrence_until, time.max) if event.recurrence_until else None
+
+    # Las ocurrencias que empiezan antes del rango pero aún no han terminado también cuentan
+    lower = timezone.localtime(window_start - duration, tz).replace(tzinfo=None)
+    upper = timezone.localtime(window_end, tz).replace(tzinfo=None)
+    if until is not None:
+        upper = min(upper, until + timedelta(microseconds=1))
+
+    if event.recurrence == Event.Recurrence.MONTHLY:
+        months = (lower.year - first.year) * 12 + lower.month - first.month - 1
+        index = max(months // interval, 0)
+        while add_months(first.replace(day=1), index * interval) < upper:
+            start = add_months(first, index * interval)
+            if start is not None and lower < start < upper:
+                yield timezone.make_aware(start, tz)
+            index += 1
+    else:
+        step = timedelta(days=interval * (7 if event.recurrence == Event.Recurrence.WEEKLY else 1))
+        index = max(-((first - lower) // step), 0)  # Primer índice con inicio > lower
+        start = first + index * step
+        while start < upper:
+            if start > lower:
+                yield timezone.make_aware(start, tz)
+            start += step
+
+
+def expand(event, window_start, window_end):
+    """
+    Ocurrencias de `event` que se solapan con el rango, aplicando las
+    excepciones (cancelaciones y cambios). Conviene traer `event.exceptions`
+    con prefetch_related.
+    """
+    if not event.is_recurring:
+        occurrence = Occurrence(event, event.start_time)
+        if occurrence.overlaps(window_start, window_end):
+            yield occurrence
+        return
+
+    exceptions = {exception.original_start: exception for exception in event.exceptions.all()}
+    for start in iter_starts(event, window_start, window_end):
+        exception = exceptions.pop(start, None)
+        if exception is not None and exception.is_cancelled:
+            continue
+        occurrence = Occurrence(event, start, exception)
+        if occurrence.overlaps(window_start, window_end):
+            yield occurrence
+
+    # Ocurrencias de fuera del rango que se han movido dentro de él
+    for original_start, exception in exceptions.items():
+        if exception.is_cancelled or exception.start_time is None:
+            continue
+        occurrence = Occurrence(event, original_start, exception)
+        if occurrence.overlaps(window_start, window_end) and is_occurrence(event, original_start):
+            yield occurrence
+
+
+def is_occurrence(event, start):
+    """Comprueba que `start` es el inicio de una ocurrencia de la regla del evento."""
+    return any(
+        candidate == start
+        for candidate in iter_starts(event, start, start + timedelta(microseconds=1))
+    )
+
+
+def overlapping_events(events, start=None, end=None):
+    """
+    Filtra `events` a los que pueden tener ocurrencias en el rango: los
+    normales que se solapan con él y las reglas que empiezan antes de su fin y
+    no han terminado antes de su inicio.
+    """
+    single = Q(recurrence=Event.Recurrence.NONE)
+    recurring = ~Q(recurrence=Event.Recurrence.NONE)
+    if end is not None:
+        single &= Q(start_time__lt=end)
+        recurring &= Q(start_time__lt=end)
+    if start is not None:
+        single &= Q(end_time__gt=start)
+        recurring &= Q(recurrence_until__isnull=True) | Q(recurrence_until__gte=timezone.localdate(start))
+    return events.filter(single | recurring)
+
+
+def expand_all(events, start, end):
+    """Ocurrencias de una lista de eventos ya filtrada (con las excepciones precargadas)."""
+    return [occurrence for event in events for occurrence in expand(event, start, end)]
+
+
+def occurrences_between(events, start, end):
+    """Todas las ocurrencias de `events` en el rango, ordenadas por inicio."""
+    events = overlapping_events(events, start, end).prefetch_related('exceptions')
+    occurrences = expand_all(events, start, end)
+    occurrences.sort(key=lambda occurrence: (occurrence.start_time, occurrence.id))
+    return occurrences
+
+
+def get_occurrence(event, key):
+    """
+    Ocurrencia de la serie identificada por `key` (su inicio original en ISO),
+    con su excepción si la tiene. Devuelve (ocurrencia, excepción) o (None, None).
+    """
+    original_start = parse_datetime(key or '')
+    if original_start is None or not event.is_recurring or not is_occurrence(event, original_start):
+        return None, None
+    exception = event.exceptions.filter(original_start=original_start).first()
+    if exception is not None and exception.is_cancelled:
+        return None, None
+    return Occurrence(event, original_start, exception), exception
+
+
+def rekey_exceptions(event, previous):
+    """
+    Mantiene las excepciones de una serie después de editar su regla
+    (`previous` es una copia del evento antes del cambio). Si la repetición es
+    la misma y solo se ha movido el inicio, cada excepción se desplaza lo
+    mismo en hora local; las que no corresponden a ninguna ocurrencia de la
+    nueva regla se borran para no quedar huérfanas.
+    """
+    rule = (event.recurrence, event.recurrence_interval)
+    if event.start_time == previous.start_time and rule == (previous.recurrence, previous.recurrence_interval):
+        return
+
+    exceptions = list(event.exceptions.all())
+    if not exceptions:
+        return
+
+    kept = []
+    if event.is_recurring and rule == (previous.recurrence, previous.recurrence_interval):
+        tz = timezone.get_current_timezone()
+        shift = (
+            timezone.localtime(event.start_time, tz).replace(tzinfo=None)
+            - timezone.localtime(previous.start_time, tz).replace(tzinfo=None)
+        )
+        for exception in exceptions:
+            local = timezone.localtime(exception.original_start, tz).replace(tzinfo=None)
+            exception.original_start = timezone.make_aware(local + shift, tz)
+            if is_occurrence(event, exception.original_start):
+                kept.append(exception)
+
+    # Se reemplazan todas a la vez: moverlas una a una podría chocar con la
+    # restricción única de (event, original_start)
+    event.exceptions.all().delete()
+    for exception in kept:
+        exception.pk = None
+    EventException.objects.bulk_create(kept)
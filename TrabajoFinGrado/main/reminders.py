@@ -0,0 +1,88 @@
+from django.core.mail import send_mass_mail
+from django.db.models import Case, F, Prefetch, Q, Value, When
+from django.utils import timezone
+
+from .models import Event, EventReminder
+from .recurrence import Occurrence, occurrences_between
+
+# Con cuánta antelación se avisa de un evento
+REMINDER_LEAD = timezone.timedelta(hours=24)
+
+SENDER = 'saympl3xfp@gmail.com'  # Reemplazar con tu correo
+
+
+def pending_reminders(until, start=None, events=None):
+    """
+    Ocurrencias (ver main.recurrence) que empiezan entre `start` (por defecto
+    ahora) y `until` y cuyo recordatorio no se ha enviado (o se envió para otra
+    hora de inicio), ordenadas por inicio. `events` restringe los eventos en
+    los que se busca.
+
+    Los eventos normales se filtran en la BD con el índice de start_time; las
+    reglas periódicas se expanden solo en ese rango y sus avisos se comprueban
+    en EventReminder por el inicio original de cada ocurrencia.
+    """
+    start = start or timezone.now()
+    events = (events if events is not None else Event.objects.all()).exclude(user__email='').select_related('user')
+
+    single = list(
+        events.filter(recurrence=Event.Recurrence.NONE, start_time__gte=start, start_time__lte=until)
+        .filter(Q(reminded_start_time__isnull=True) | ~Q(reminded_start_time=F('start_time')))
+    )
+    occurrences = [Occurrence(event, event.start_time) for event in single]
+
+    # Avisos ya enviados de las ocurrencias que aún no han empezado
+    recurring = events.exclude(recurrence=Event.Recurrence.NONE).prefetch_related(
+        Prefetch('reminders', queryset=EventReminder.objects.filter(start_time__gte=start), to_attr='sent_reminders')
+    )
+    for occurrence in occurrences_between(recurring, start, until + timezone.timedelta(microseconds=1)):
+        reminded = {reminder.original_start: reminder.start_time for reminder in occurrence.event.sent_reminders}
+        if occurrence.start_time >= start and reminded.get(occurrence.original_start) != occurrence.start_time:
+            occurrences.append(occurrence)
+
+    occurrences.sort(key=lambda occurrence: (occurrence.start_time, occurrence.id))
+    return occurrences
+
+
+def build_reminder(occurrence):
+    user = occurrence.event.user
+    return (
+        'Recordatorio: Evento en 24 horas',
+        f'Hola {user.username}, tienes el evento "{occurrence.title}" en 24 horas.',
+        SENDER,
+        [user.email],
+    )
+
+
+def send_reminders(occurrences, connection):
+    """Envía los recordatorios por `connection` y los marca como enviados. Devuelve cuántos se enviaron."""
+    if not occurrences:
+        return 0
+    send_mass_mail([build_reminder(occurrence) for occurrence in occurrences], connection=connection)
+
+    # Se marcan después de enviar (si el envío falla, se reintentan en la siguiente
+    # pasada) y con la hora de inicio para la que se avisó: si el evento se ha movido
+    # entretanto no se marca, y se avisa de la nueva hora
+    single = [occurrence for occurrence in occurrences if not occurrence.is_recurring]
+    if single:
+        Event.objects.filter(pk__in=[occurrence.id for occurrence in single]).update(
+            reminded_start_time=Case(
+                *[When(pk=occurrence.id, start_time=occurrence.start_time, then=Value(occurrence.start_time)) for occurrence in single],
+                default=F('reminded_start_time'),
+            )
+        )
+
+    # En las series se guarda el inicio avisado de cada ocurrencia; si una excepción
+    # la mueve después, deja de coincidir y se vuelve a avisar
+    recurring = [occurrence for occurrence in occurrences if occurrence.is_recurring]
+    if recurring:
+        EventReminder.objects.bulk_create(
+            [
+                EventReminder(event_id=occurrence.id, original_start=occurrence.original_start, start_time=occurrence.start_time)
+                for occurrence in recurring
+            ],
+            update_conflicts=True,
+            unique_fields=['event', 'original_start'],
+            update_fields=['start_time'],
+        )
+    return len(occurrences)
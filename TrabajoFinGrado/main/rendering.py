@@ -0,0 +1,62 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import markdown
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'codehilite', 'extra']
+
+# Una instancia de Markdown por hilo: crearla (y registrar las extensiones) es
+# lo caro, y una misma instancia no se puede usar desde dos hilos a la vez.
+_local = threading.local()
+
+
+def get_renderer():
+    renderer = getattr(_local, 'renderer', None)
+    if renderer is None:
+        renderer = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        _local.renderer = renderer
+    return renderer
+
+
+class RenderCache:
+    """Caché LRU en memoria del HTML renderizado, indexada por el hash del contenido."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._items.get(key)
+            if html is not None:
+                self._items.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._items[key] = html
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_cache = RenderCache(getattr(settings, 'MARKDOWN_CACHE_SIZE', 1024))
+
+
+def render_markdown(text):
+    """Convierte el contenido markdown a HTML seguro."""
+    key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    html = _cache.get(key)
+    if html is None:
+        html = get_renderer().reset().convert(text)
+        _cache.set(key, html)
+    return mark_safe(html)
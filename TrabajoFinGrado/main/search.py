@@ -0,0 +1,130 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import User
+
+
+SEARCH_FIELDS = ['username', 'first_name', 'last_name', 'email']
+
+
+def filter_students(degrees=None, groups=None):
+    """Alumnos filtrados por grado y grupo, sin búsqueda de texto."""
+    students = User.objects.filter(user_type='Student')
+    if degrees:
+        students = students.filter(degree__in=degrees)
+    if groups:
+        students = students.filter(group__in=groups)
+    return students
+
+
+def search_students(query, degrees=None, groups=None, limit=None):
+    """
+    Busca alumnos cuyo usuario, nombre, apellidos o correo contengan `query`,
+    ordenados por relevancia y limitados a STUDENT_SEARCH_LIMIT resultados.
+
+    En PostgreSQL los icontains (UPPER(campo) LIKE UPPER(...)) usan el índice
+    GIN de trigramas sobre UPPER(campo) (migración
+    0019_student_search_upper_trigram_index) y la relevancia es la similitud de
+    trigramas; en otras bases de datos (SQLite en pruebas) se ordena primero
+    por las coincidencias al principio del nombre de usuario.
+    """
+    limit = limit or getattr(settings, 'STUDENT_SEARCH_LIMIT', 50)
+    query = query.strip()
+
+    matches = Q()
+    for field in SEARCH_FIELDS:
+        matches |= Q(**{f'{field}__icontains': query})
+    students = filter_students(degrees, groups).filter(matches)
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        students = students.annotate(
+            rank=Greatest(*[TrigramSimilarity(field, query) for field in SEARCH_FIELDS])
+        ).order_by('-rank', 'username')
+    else:
+        students = students.annotate(
+            rank=Case(
+                When(username__iexact=query, then=Value(2)),
+                When(username__istartswith=query, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        ).order_by('-rank', 'username')
+
+    return students[:limit]
+
+
+def encode_cursor(student):
+    return urlsafe_base64_encode(force_bytes(f"{student.id}:{student.username}"))
+
+
+def decode_cursor(cursor):
+    """Devuelve (username, id) del cursor, o None si no es válido."""
+    try:
+        student_id, username = force_str(urlsafe_base64_decode(cursor)).split(':', 1)
+        return username, int(student_id)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate_students(students, cursor=None, page_size=None):
+    """
+    Paginación por cursor (keyset) sobre (username, id): cada página es un
+    WHERE sobre el índice de username y un LIMIT, sin OFFSET, así que cuesta lo
+    mismo sea cual sea la página. Devuelve los alumnos y el cursor de la
+    siguiente página (None si es la última).
+    """
+    page_size = page_size or getattr(settings, 'STUDENT_PAGE_SIZE', 50)
+    students = students.order_by('username', 'id')
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        username, student_id = position
+        students = students.filter(Q(username__gt=username) | Q(username=username, id__gt=student_id))
+
+    page = list(students[:page_size + 1])
+    next_cursor = encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
+
+
+#~~~~~~~~CACHÉ DEL LISTADO~~~~~~~~
+
+STUDENT_LIST_VERSION_KEY = 'student_list_version'
+
+
+def student_list_version():
+    # Se inicializa con la hora para que una caché vacía (p. ej. tras reiniciar)
+    # no vuelva a generar versiones ya usadas en claves anteriores
+    cache.add(STUDENT_LIST_VERSION_KEY, int(time.time() * 1000), timeout=None)
+    return cache.get(STUDENT_LIST_VERSION_KEY)
+
+
+def bump_student_list_version():
+    """Invalida todas las respuestas cacheadas del listado (se llama al guardar o borrar un alumno)."""
+    try:
+        cache.incr(STUDENT_LIST_VERSION_KEY)
+    except ValueError:
+        student_list_version()
+
+
+def student_list_cache_key(search_query, degrees, groups, cursor, partial):
+    """Clave de caché del listado a partir de los filtros normalizados."""
+    params = json.dumps([
+        search_query.strip().lower(),
+        sorted(degrees),
+        sorted(groups),
+        cursor or '',
+        partial,
+    ])
+    digest = hashlib.sha1(f"{student_list_version()}:{params}".encode('utf-8')).hexdigest()
+    return f"student_list:{digest}"
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+from .search import bump_student_list_version
+
+
+@receiver(post_save, sender=User)
+def student_saved(sender, instance, update_fields=None, **kwargs):
+    # Iniciar sesión solo actualiza last_login, que no aparece en el listado
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if instance.user_type == 'Student':
+        bump_student_list_version()
+
+
+@receiver(post_delete, sender=User)
+def student_deleted(sender, instance, **kwargs):
+    if instance.user_type == 'Student':
+        bump_student_list_version()
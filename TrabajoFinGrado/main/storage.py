@@ -0,0 +1,57 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Guarda cada fichero una sola vez bajo una ruta derivada del SHA-256 de su
+    contenido: `<upload_to>/ab/cd/abcd...<ext>`. Dos subidas idénticas acaban
+    en el mismo fichero, así que nunca se sobrescribe ni se borra al guardar;
+    los ficheros sin referencias los elimina `collect_media_garbage`.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo depende del contenido y se decide en _save
+        return name
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        content_hash = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(posixpath.dirname(name), content_hash[:2], content_hash[2:4], content_hash + extension)
+
+    def touch(self, name):
+        # El fichero vuelve a estar en uso: collect_media_garbage respeta su
+        # periodo de gracia aunque fuera un huérfano antiguo
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name) and self.touch(name):
+            return name
+
+        # Se escribe en un temporal y se enlaza con el nombre final: nadie ve
+        # un fichero a medias y dos subidas simultáneas del mismo contenido no
+        # se pisan (el segundo enlace falla y el contenido ya es el mismo)
+        temp_name = super()._save(posixpath.join(posixpath.dirname(name), f".{uuid.uuid4().hex}.tmp"), content)
+        try:
+            os.link(self.path(temp_name), self.path(name))
+        except FileExistsError:
+            self.touch(name)
+        finally:
+            os.remove(self.path(temp_name))
+        return name
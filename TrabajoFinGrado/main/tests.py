@@ -1,3 +1,1318 @@
-from django.test import TestCase
+import html
+import importlib
+import importlib.util
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.sessions.models import Session
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from PIL import Image
+
+from . import jobs, llm, rendering
+from .chat_context import build_chat_context
+from .management.commands.run_reminder_scheduler import Command as ReminderScheduler, ReminderHeap
+from .middleware import AccessPolicy
+from .search import filter_students, paginate_students, search_students, student_list_cache_key
+from .models import User, Chat, ChatMessage, Event, EventException, EventReminder, Exam, Exercise, ExerciseSet, Forum, Comment, Job, OutgoingEmail
+from .reminders import REMINDER_LEAD, pending_reminders, send_reminders
+
+
+class RecordingBackend(llm.FakeBackend):
+    """
+    FakeBackend que responde con el propio prompt y registra cuántas llamadas
+    llegan a estar en curso a la vez. Falla si el prompt contiene 'falla' o en
+    la llamada número `fail_on_call`.
+    """
+
+    lock = threading.Lock()
+    calls = in_flight = max_in_flight = 0
+
+    def __init__(self, fail_on_call=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_on_call = fail_on_call
+
+    def completion(self, prompt, **kwargs):
+        cls = type(self)
+        with cls.lock:
+            cls.calls += 1
+            call = cls.calls
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            # Si el prompt termina en un dígito, cuanto mayor más tarda la respuesta
+            time.sleep(self.latency * (int(prompt[-1]) if prompt[-1].isdigit() else 1))
+            if 'falla' in prompt or call == self.fail_on_call:
+                raise ConnectionError('API caída')
+            return f'Enunciado {prompt}\nSolución:\nprint({prompt!r})'
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    @classmethod
+    def reset(cls):
+        cls.calls = cls.in_flight = cls.max_in_flight = 0
+
+
+@override_settings(
+    LLM_BACKEND='main.tests.RecordingBackend', LLM_BACKEND_OPTIONS={'latency': 0.05}, JOBS_EAGER=True,
+)
+class ExerciseGenerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+
+    def setUp(self):
+        RecordingBackend.reset()
+
+    def generate(self, number_of_exercises):
+        return jobs.enqueue(
+            'generate_exercises', self.student,
+            set_name='Conjunto', topic=1, difficulty='Easy', number_of_exercises=number_of_exercises,
+        )
+
+    def test_completions_run_concurrently(self):
+        job = self.generate(5)
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(RecordingBackend.calls, 5)
+        self.assertGreater(RecordingBackend.max_in_flight, 1)
+        exercises = Exercise.objects.filter(student=self.student)
+        self.assertEqual(len(exercises), 5)
+        self.assertTrue(all(exercise.html_content for exercise in exercises))
+
+    def test_results_keep_the_order_of_the_prompts(self):
+        # Los primeros prompts son los que más tardan en responder
+        prompts = [f'p{i}' for i in range(5, 0, -1)]
+        results = llm.complete_prompts(prompts)
+        self.assertEqual([result.split('\n')[0] for result in results], [f'Enunciado {prompt}' for prompt in prompts])
+
+    def test_one_failed_completion_fails_the_whole_set(self):
+        with self.assertRaises(ConnectionError):
+            llm.complete_prompts(['p1', 'falla', 'p2'])
+
+        RecordingBackend.reset()
+        with override_settings(LLM_BACKEND_OPTIONS={'latency': 0.0, 'fail_on_call': 3}):
+            job = self.generate(4)
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn('API caída', job.error)
+        self.assertFalse(Exercise.objects.exists())
+
+
+class QueryBudgetMixin:
+    """Permite fijar un máximo de consultas por vista para detectar N+1."""
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > max_queries:
+            queries = '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, start=1))
+            self.fail(f"Se han ejecutado {executed} consultas, el máximo es {max_queries}:\n{queries}")
+
+
+@override_settings(JOBS_EAGER=False)
+class ExamQueryBudgetTests(QueryBudgetMixin, TestCase):
+    # Sesión y usuario (2) + las consultas propias de cada vista
+    EXAM_DETAIL_BUDGET = 4
+    ARCHIVED_EXAM_BUDGET = 4
+    SUBMIT_EXAM_BUDGET = 9  # examen, entrega, respuestas (2) y job dentro de una transacción (savepoint y release)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        cls.exercise_set = ExerciseSet.objects.create(student=cls.student)
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        # Sin last_activity la primera petición reescribiría la sesión
+        session = self.client.session
+        session['last_activity'] = timezone.now().isoformat()
+        session.save()
+
+    def create_exam(self, number_of_exercises=4, is_submitted=False):
+        exam = Exam.objects.create(student=self.student, name='Examen', is_submitted=is_submitted)
+        exercises = Exercise.objects.bulk_create([
+            Exercise(
+                student=self.student, exercise_set=self.exercise_set, statement=f'Enunciado {i}',
+                solution='pass', difficulty='Easy', topic=1, is_correct=is_submitted, score=1.0,
+            )
+            for i in range(number_of_exercises)
+        ])
+        exam.exercises.set(exercises)
+        return exam
+
+    def test_exam_detail(self):
+        for number_of_exercises in (4, 12):
+            exam = self.create_exam(number_of_exercises)
+            with self.assertMaxQueries(self.EXAM_DETAIL_BUDGET):
+                response = self.client.get(reverse('exam_detail', kwargs={'exam_id': exam.exam_id}))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['exercises']), number_of_exercises)
+
+    def test_archived_exam(self):
+        for number_of_exercises in (4, 12):
+            exam = self.create_exam(number_of_exercises, is_submitted=True)
+            with self.assertMaxQueries(self.ARCHIVED_EXAM_BUDGET):
+                response = self.client.get(reverse('archived_exam', kwargs={'exam_id': exam.exam_id}))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [exercise.exercise_id for exercise in response.context['exercises']],
+                sorted(exam.exercises.values_list('exercise_id', flat=True)),
+            )
+
+    def test_submit_exam(self):
+        exam = self.create_exam()
+        solutions = {f'student_solution_{exercise.exercise_id}': 'print(1)' for exercise in exam.exercises.all()}
+        with self.assertMaxQueries(self.SUBMIT_EXAM_BUDGET):
+            response = self.client.post(reverse('submit_exam', kwargs={'exam_id': exam.exam_id}), solutions)
+        self.assertEqual(response.status_code, 200)
+
+    def test_exam_can_only_be_submitted_once(self):
+        exam = self.create_exam()
+        url = reverse('submit_exam', kwargs={'exam_id': exam.exam_id})
+        self.client.post(url, {'student_solution_1': 'print(1)'})
+        exam.refresh_from_db()
+        self.assertTrue(exam.is_submitted)
+        self.assertIsNotNone(exam.submission_time)
+
+        # Mientras se corrige se sigue esperando al mismo job y el examen ya no se sirve
+        response = self.client.post(url, {'student_solution_1': 'print(2)'})
+        self.assertEqual(response.context['job'], Job.objects.get())
+        response = self.client.get(reverse('exam_detail', kwargs={'exam_id': exam.exam_id}))
+        self.assertRedirects(response, reverse('archived_exam', kwargs={'exam_id': exam.exam_id}))
+
+        Job.objects.update(status=Job.Status.DONE)
+        response = self.client.post(url, {'student_solution_1': 'print(3)'})
+        self.assertRedirects(response, reverse('archived_exam', kwargs={'exam_id': exam.exam_id}))
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(Job.objects.get().payload['solutions'], {'1': 'print(1)'})
+
+
+class GradingBackend(llm.FakeBackend):
+    """Da por correctas las soluciones que imprimen 'bien'."""
+
+    def chat_completion(self, messages, **kwargs):
+        return 'correcto' if "print('bien')" in messages[-1]['content'] else 'incorrecto: no imprime lo pedido'
+
+
+class FailingGradingBackend(llm.FakeBackend):
+    def chat_completion(self, messages, **kwargs):
+        raise ConnectionError('API caída')
+
+
+@override_settings(LLM_BACKEND='main.tests.GradingBackend', JOBS_EAGER=True)
+class ExamGradingTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.client.force_login(self.student)
+        exercise_set = ExerciseSet.objects.create(student=self.student)
+        self.exam = Exam.objects.create(student=self.student, name='Examen')
+        self.exercises = Exercise.objects.bulk_create([
+            Exercise(
+                student=self.student, exercise_set=exercise_set, statement=f'Enunciado {i}',
+                solution='pass', difficulty='Easy', topic=1,
+            )
+            for i in range(4)
+        ])
+        self.exam.exercises.set(self.exercises)
+
+    def test_grade_is_stored_when_the_exam_is_graded(self):
+        solutions = ["print('bien')", "print('mal')", '', "print('bien')"]
+        self.client.post(reverse('submit_exam', kwargs={'exam_id': self.exam.exam_id}), {
+            f'student_solution_{exercise.exercise_id}': solution
+            for exercise, solution in zip(self.exercises, solutions)
+        })
+
+        self.exam.refresh_from_db()
+        self.assertTrue(self.exam.is_submitted)
+        self.assertEqual(self.exam.grade, 1.5 + 4.25)
+        self.assertEqual(
+            list(self.exam.exercises.order_by('exercise_id').values_list('is_correct', 'score', 'student_solution')),
+            [(True, 1.5, "print('bien')"), (False, 0.0, "print('mal')"), (False, 0.0, ''), (True, 4.25, "print('bien')")],
+        )
+
+        response = self.client.get(reverse('archived_exam', kwargs={'exam_id': self.exam.exam_id}))
+        self.assertEqual(response.context['total_score'], 5.75)
+
+    @override_settings(LLM_BACKEND='main.tests.FailingGradingBackend')
+    def test_failed_grading_keeps_the_answers_and_allows_resubmitting(self):
+        url = reverse('submit_exam', kwargs={'exam_id': self.exam.exam_id})
+        self.client.post(url, {f'student_solution_{self.exercises[0].exercise_id}': "print('bien')"})
+
+        self.exam.refresh_from_db()
+        self.assertFalse(self.exam.is_submitted)
+        self.assertEqual(Job.objects.get().status, Job.Status.FAILED)
+        self.assertEqual(
+            list(self.exam.exercises.order_by('exercise_id').values_list('student_solution', flat=True)),
+            ["print('bien')", '', '', ''],
+        )
+        # El examen se vuelve a servir con las respuestas
+        response = self.client.get(reverse('exam_detail', kwargs={'exam_id': self.exam.exam_id}))
+        self.assertContains(response, "print(&#x27;bien&#x27;)</textarea>")
+
+        with override_settings(LLM_BACKEND='main.tests.GradingBackend'):
+            self.client.post(url, {f'student_solution_{self.exercises[0].exercise_id}': "print('bien')"})
+        self.exam.refresh_from_db()
+        self.assertTrue(self.exam.is_submitted)
+        self.assertEqual(self.exam.grade, 1.5)
+
+    def test_migration_backfills_grades_of_submitted_exams(self):
+        Exercise.objects.filter(pk__in=[self.exercises[0].pk, self.exercises[2].pk]).update(is_correct=True, score=2.0)
+        Exercise.objects.filter(pk=self.exercises[1].pk).update(score=3.0)
+        Exam.objects.filter(pk=self.exam.pk).update(is_submitted=True)
+        pending = Exam.objects.create(student=self.student, name='Sin entregar')
+        pending.exercises.set(self.exercises)
+
+        migration = importlib.import_module('main.migrations.0020_backfill_exam_grade')
+        migration.backfill_exam_grades(apps, None)
+
+        self.exam.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual(self.exam.grade, 4.0)
+        self.assertEqual(pending.grade, 0.0)
+
+
+class JobQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+
+    @override_settings(JOBS_RUNNING_TIMEOUT=600)
+    def test_jobs_of_a_dead_worker_are_requeued(self):
+        job = jobs.enqueue('grade_exam', self.student, exam_id=1, solutions={})
+        self.assertEqual(jobs.claim_next_job(), job)
+        self.assertIsNone(jobs.claim_next_job())
+
+        # Un job lento cuyo worker sigue renovando el heartbeat no vuelve a la cola
+        Job.objects.update(started_at=timezone.now() - timezone.timedelta(seconds=3600))
+        self.assertTrue(jobs.renew_heartbeat(job))
+        self.assertIsNone(jobs.claim_next_job())
+
+        Job.objects.update(heartbeat_at=timezone.now() - timezone.timedelta(seconds=900))
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed, job)
+        self.assertEqual(claimed.status, Job.Status.RUNNING)
+        self.assertEqual(claimed.attempts, 2)
+        self.assertGreater(claimed.started_at, timezone.now() - timezone.timedelta(seconds=60))
+
+    @override_settings(
+        LLM_BACKEND='main.tests.FailingGradingBackend', JOBS_EAGER=False, JOBS_MAX_ATTEMPTS=2, JOBS_RETRY_DELAY=60,
+    )
+    def test_failed_jobs_are_retried_with_backoff(self):
+        exam = Exam.objects.create(student=self.student, name='Examen', is_submitted=True)
+        exercise = Exercise.objects.create(
+            student=self.student, exercise_set=ExerciseSet.objects.create(student=self.student),
+            statement='Enunciado', solution='pass', difficulty='Easy', topic=1,
+        )
+        exam.exercises.add(exercise)
+        jobs.enqueue('grade_exam', self.student, exam_id=exam.exam_id, solutions={str(exercise.exercise_id): 'print(1)'})
+
+        job = jobs.run_job(jobs.claim_next_job())
+        self.assertEqual((job.status, job.attempts), (Job.Status.PENDING, 1))
+        self.assertGreater(job.run_after, timezone.now() + timezone.timedelta(seconds=50))
+        self.assertIn('API caída', job.error)
+        # Hasta que no pasa la espera no se vuelve a reclamar
+        self.assertIsNone(jobs.claim_next_job())
+
+        Job.objects.update(run_after=timezone.now())
+        job = jobs.run_job(jobs.claim_next_job())
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+        exam.refresh_from_db()
+        self.assertFalse(exam.is_submitted)
+
+
+class ChatMessageTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.chat = Chat.objects.create(student=self.student)
+
+    def test_messages_get_consecutive_sequences(self):
+        for content in ('Hola', 'Adiós'):
+            self.chat.add_message('user', content)
+            self.chat.add_message('assistant', f'*{content}*')
+        self.assertEqual(list(self.chat.messages.values_list('sequence', flat=True)), [1, 2, 3, 4])
+        self.assertEqual(self.chat.messages.last().html_content, '<p><em>Adiós</em></p>')
+
+    def test_deleted_chat_raises_instead_of_retrying(self):
+        Chat.objects.filter(pk=self.chat.pk).delete()
+        with self.assertRaises(Chat.DoesNotExist):
+            self.chat.add_message('user', 'Hola')
+
+    def test_backfill_renders_assistant_messages_without_html(self):
+        # Mensajes guardados antes de que existiera html_content
+        ChatMessage.objects.bulk_create([
+            ChatMessage(chat=self.chat, role='user', content='**Hola**', sequence=1),
+            ChatMessage(chat=self.chat, role='assistant', content='*Uno*', sequence=2),
+            ChatMessage(chat=self.chat, role='assistant', content='*Dos*', sequence=3),
+            ChatMessage(chat=self.chat, role='assistant', content='*Tres*', sequence=4, html_content='<p>ya</p>'),
+        ])
+        out = io.StringIO()
+        call_command('render_chat_messages', batch_size=1, stdout=out)
+        self.assertIn('Se han renderizado 2 mensajes', out.getvalue())
+        self.assertEqual(
+            list(self.chat.messages.values_list('html_content', flat=True)),
+            ['', '<p><em>Uno</em></p>', '<p><em>Dos</em></p>', '<p>ya</p>'],
+        )
+
+        # Con --all se vuelven a renderizar también los que ya tenían HTML
+        call_command('render_chat_messages', all=True, stdout=io.StringIO())
+        self.assertEqual(self.chat.messages.get(sequence=4).html_content, '<p><em>Tres</em></p>')
+
+
+@override_settings(
+    LLM_BACKEND='main.llm.FakeBackend', LLM_BACKEND_OPTIONS={'chat_text': 'Resumen'}, CHAT_CONTEXT_TOKEN_BUDGET=100,
+)
+class ChatContextTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.chat = Chat.objects.create(student=self.student)
+
+    def test_old_turns_are_folded_into_the_summary(self):
+        for i in range(6):
+            self.chat.add_message('user' if i % 2 == 0 else 'assistant', f'Mensaje {i} ' + 'x' * 80)
+
+        context = build_chat_context(self.chat)
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.summary, 'Resumen')
+        self.assertEqual(context[0], {'role': 'system', 'content': 'Resumen de la conversación anterior: Resumen'})
+        self.assertEqual(context[-1]['content'], 'Mensaje 5 ' + 'x' * 80)
+        self.assertEqual(self.chat.summary_upto, 6 - (len(context) - 1))
+
+    def test_single_message_over_the_budget_is_not_summarized(self):
+        self.chat.add_message('user', 'x' * 1000)
+
+        context = build_chat_context(self.chat)
+        self.chat.refresh_from_db()
+        self.assertEqual((self.chat.summary, self.chat.summary_upto), ('', 0))
+        self.assertEqual(context, [{'role': 'user', 'content': 'x' * 1000}])
+
+        # Tampoco justo después de un resumen
+        Chat.objects.filter(pk=self.chat.pk).update(summary='Antes', summary_upto=1)
+        self.chat.refresh_from_db()
+        self.chat.add_message('user', 'y' * 1000)
+        context = build_chat_context(self.chat)
+        self.assertEqual([message['content'] for message in context], [
+            'Resumen de la conversación anterior: Antes', 'y' * 1000,
+        ])
+
+
+class FailingStreamBackend(llm.FakeBackend):
+    async def chat_stream(self, **kwargs):
+        yield 'Hola'
+        raise ConnectionError('API caída')
+
+
+@override_settings(LLM_BACKEND='main.llm.FakeBackend', LLM_BACKEND_OPTIONS={'chat_text': 'Usa **print** para mostrarlo'})
+class ChatStreamTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.chat = Chat.objects.create(student=self.student)
+        self.async_client.force_login(self.student)
+
+    async def stream(self):
+        response = await self.async_client.post(
+            reverse('chat_stream', kwargs={'chat_id': self.chat.chat_id}), {'user_input': '¿Cómo muestro algo?'},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        frames = []
+        for frame in content.strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in frame.split('\n'))
+            frames.append((lines.get('event'), json.loads(lines['data'])))
+        return frames
+
+    async def test_streams_tokens_and_saves_the_reply_once(self):
+        frames = await self.stream()
+
+        self.assertEqual(
+            [data['token'] for event, data in frames if event is None],
+            ['Usa', ' **print**', ' para', ' mostrarlo'],
+        )
+        event, data = frames[-1]
+        self.assertEqual(event, 'done')
+        self.assertIn('<strong>print</strong>', data['html'])
+
+        messages = await sync_to_async(list)(self.chat.messages.values_list('sequence', 'role', 'content'))
+        self.assertEqual(messages, [
+            (1, 'user', '¿Cómo muestro algo?'),
+            (2, 'assistant', 'Usa **print** para mostrarlo'),
+        ])
+
+    @override_settings(LLM_BACKEND='main.tests.FailingStreamBackend')
+    async def test_failed_stream_does_not_save_a_partial_reply(self):
+        frames = await self.stream()
+
+        self.assertEqual(frames[-1][0], 'error')
+        roles = await sync_to_async(list)(self.chat.messages.values_list('role', flat=True))
+        self.assertEqual(roles, ['user'])
+
+
+class StudentSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        degrees = User.DegreeChoices.values
+        for i, (username, last_name, email) in enumerate([
+            ('pedro', 'Santana', 'pedro@example.com'),
+            ('anabel', 'García', 'anabel@example.com'),
+            ('luis', 'Pérez', 'ana.luis@example.com'),
+            ('juana', 'Ruiz', 'juana@example.com'),
+            ('ana', 'López', 'ana@example.com'),
+            ('carlos', 'Gómez', 'carlos@example.com'),
+        ]):
+            User.objects.create_user(
+                username=username, last_name=last_name, email=email, password='x',
+                user_type='Student', degree=degrees[i % 2], group=User.GroupChoices.GROUP_1,
+            )
+        User.objects.create_user(username='ana_profe', email='profe@example.com', password='x', user_type='Teacher')
+
+    def usernames(self, *args, **kwargs):
+        return [student.username for student in search_students(*args, **kwargs)]
+
+    def test_ranks_exact_then_prefix_matches_first(self):
+        # Sin PostgreSQL: usuario exacto, después empieza por la búsqueda y el resto por usuario
+        self.assertEqual(self.usernames(' ANA '), ['ana', 'anabel', 'juana', 'luis', 'pedro'])
+
+    def test_filters_and_limit(self):
+        self.assertEqual(self.usernames('ana', degrees=[User.DegreeChoices.SOFTWARE_ENGINEERING]), ['ana', 'luis', 'pedro'])
+        self.assertEqual(self.usernames('ana', limit=2), ['ana', 'anabel'])
+        with self.settings(STUDENT_SEARCH_LIMIT=3):
+            self.assertEqual(len(self.usernames('ana')), 3)
+
+    @skipUnless(connection.vendor == 'postgresql', 'El índice de trigramas solo existe en PostgreSQL')
+    def test_search_uses_the_trigram_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = search_students('ana').explain()
+        self.assertIn('main_user_student_search_upper_trgm', plan)
+
+
+class StudentListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(
+            username='alumno', first_name='Ana', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.teacher = User.objects.create_user(
+            username='profe', email='profe@example.com', password='x', user_type='Teacher',
+        )
+        self.client.force_login(self.teacher)
+
+    def get_list(self, **headers):
+        return self.client.get(reverse('home'), {'search': 'alumno'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest', **headers)
+
+    def test_etag_follows_the_served_html(self):
+        response = self.get_list()
+        etag = response['ETag']
+        self.assertContains(response, 'Ana')
+        self.assertEqual(self.get_list(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Guardar el alumno en este proceso cambia la versión y la respuesta al momento
+        self.student.first_name = 'Eva'
+        self.student.save()
+        response = self.get_list(HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Eva')
+
+    def test_change_missed_by_the_local_version_expires_with_the_cache(self):
+        etag = self.get_list()['ETag']
+
+        # Un cambio hecho en otro proceso no cambia la versión de este (caché locmem)
+        User.objects.filter(pk=self.student.pk).update(first_name='Eva')
+        self.assertEqual(self.get_list(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Al caducar la entrada (STUDENT_LIST_CACHE_TTL) el viejo ETag deja de valer
+        cache.delete(student_list_cache_key('alumno', [], [], None, 'partials/student_list.html'))
+        response = self.get_list(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Eva')
+
+
+@override_settings(STUDENT_PAGE_SIZE=2)
+class StudentListPagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        software, other = User.DegreeChoices.values[:2]
+        for i, username in enumerate(['ana', 'bea', 'carla', 'dani', 'elena', 'fran']):
+            User.objects.create_user(
+                username=username, email=f'{username}@example.com', password='x', user_type='Student',
+                degree=software if i % 2 == 0 else other, group=User.GroupChoices.GROUP_1,
+            )
+        cls.degree = software
+        cls.teacher = User.objects.create_user(
+            username='profe', email='profe@example.com', password='x', user_type='Teacher',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+
+    def usernames(self, response):
+        return [student.username for student in response.context['students']]
+
+    def test_cursor_pages_cover_every_student_once(self):
+        pages, cursor = [], None
+        while True:
+            students, cursor = paginate_students(filter_students(), cursor)
+            pages.append([student.username for student in students])
+            if cursor is None:
+                break
+        self.assertEqual(pages, [['ana', 'bea'], ['carla', 'dani'], ['elena', 'fran']])
+
+        # Un alumno nuevo antes del cursor no desplaza la página siguiente (no hay OFFSET)
+        students, cursor = paginate_students(filter_students())
+        User.objects.create_user(username='abel', email='abel@example.com', password='x', user_type='Student')
+        self.assertEqual([student.username for student in paginate_students(filter_students(), cursor)[0]], ['carla', 'dani'])
+
+    def test_malformed_cursor_starts_from_the_first_page(self):
+        for cursor in ('basura', 'bm9fc2VwYXJhZG9y', 'eDphbmE', '%%%'):
+            response = self.client.get(reverse('home'), {'after': cursor}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '>ana</a>')
+            self.assertContains(response, '>bea</a>')
+
+    def test_load_more_link_keeps_the_filters(self):
+        response = self.client.get(reverse('home'), {'degrees': self.degree})
+        self.assertEqual(self.usernames(response), ['ana', 'carla'])
+
+        # Sin JavaScript se sigue el enlace de la última fila
+        href = re.search(r'href="\?([^"]+)" class="load-more-link"', response.content.decode()).group(1)
+        response = self.client.get(reverse('home') + '?' + html.unescape(href))
+        self.assertEqual(self.usernames(response), ['elena'])
+        self.assertEqual(response.context['selected_degrees'], [self.degree])
+        self.assertIsNone(response.context['next_cursor'])
+
+
+class ForumQueryBudgetTests(QueryBudgetMixin, TestCase):
+    # Sesión y usuario (2) + recientes, total de la paginación y página
+    FORUM_HOME_BUDGET = 5
+    # Sesión y usuario (2) + foro con su autor y página de comentarios con sus autores
+    VIEW_FORUM_BUDGET = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.student)
+        session = self.client.session
+        session['last_activity'] = timezone.now().isoformat()
+        session.save()
+
+    def test_forum_home(self):
+        for number_of_forums in (3, 15):
+            for i in range(number_of_forums):
+                forum = Forum.objects.create(
+                    title=f'Debate {i}', description='...', created_by=self.student, is_closed=i % 3 == 0,
+                )
+                Comment.objects.create(forum=forum, user=self.student, content='Hola')
+            with self.assertMaxQueries(self.FORUM_HOME_BUDGET):
+                response = self.client.get(reverse('forum_home'))
+            self.assertEqual(response.status_code, 200)
+
+        forums = list(response.context['all_forums'])
+        self.assertEqual([forum.is_closed for forum in forums], sorted(forum.is_closed for forum in forums))
+        self.assertTrue(all(forum.comment_count == 1 for forum in forums))
+
+    def test_view_forum(self):
+        forum = Forum.objects.create(title='Debate', description='...', created_by=self.student)
+        Comment.objects.bulk_create([
+            Comment(forum=forum, user=self.student, content=f'Comentario {i}') for i in range(120)
+        ])
+        expected = list(forum.comments.order_by('created_at', 'id').values_list('id', flat=True))
+
+        seen, before = [], None
+        while True:
+            url = reverse('view_forum', kwargs={'forum_id': forum.id})
+            with self.assertMaxQueries(self.VIEW_FORUM_BUDGET):
+                response = self.client.get(url, {'before': before} if before else {})
+            seen = [comment.id for comment in response.context['comments']] + seen
+            before = response.context['older_comments']
+            if before is None:
+                break
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(reverse('forum_new_comments', kwargs={'forum_id': forum.id}), {'after': expected[-3]})
+        self.assertEqual([comment['id'] for comment in response.json()['comments']], expected[-2:])
+
+    @override_settings(FORUM_COMMENTS_PAGE_SIZE=2)
+    def test_new_comments_of_an_empty_forum_and_after_a_deleted_comment(self):
+        forum = Forum.objects.create(title='Debate', description='...', created_by=self.student)
+        response = self.client.get(reverse('view_forum', kwargs={'forum_id': forum.id}))
+        self.assertEqual(response.context['latest_comment'], 0)
+
+        comments = [Comment.objects.create(forum=forum, user=self.student, content=f'Comentario {i}') for i in range(3)]
+        url = reverse('forum_new_comments', kwargs={'forum_id': forum.id})
+        response = self.client.get(url, {'after': 0}).json()
+        self.assertEqual([comment['id'] for comment in response['comments']], [comments[0].id, comments[1].id])
+        self.assertEqual(response['latest'], comments[1].id)
+
+        deleted_id = comments[1].id
+        comments[1].delete()
+        response = self.client.get(url, {'after': deleted_id}).json()
+        self.assertEqual([comment['id'] for comment in response['comments']], [comments[2].id])
+
+    @override_settings(FORUM_COMMENTS_PAGE_SIZE=2)
+    def test_older_comments_before_a_deleted_comment(self):
+        forum = Forum.objects.create(title='Debate', description='...', created_by=self.student)
+        comments = [Comment.objects.create(forum=forum, user=self.student, content=f'Comentario {i}') for i in range(5)]
+        url = reverse('view_forum', kwargs={'forum_id': forum.id})
+
+        response = self.client.get(url)
+        self.assertEqual([comment.id for comment in response.context['comments']], [comments[3].id, comments[4].id])
+
+        deleted_id = comments[3].id
+        comments[3].delete()
+        response = self.client.get(url, {'before': deleted_id})
+        self.assertEqual([comment.id for comment in response.context['comments']], [comments[1].id, comments[2].id])
+        self.assertEqual(response.context['older_comments'], comments[1].id)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+
+    def upload(self, name, color):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def create_forum(self, upload):
+        return Forum.objects.create(title='Debate', description='...', created_by=self.student, image=upload)
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.create_forum(self.upload('captura.png', 'red'))
+        second = self.create_forum(self.upload('otra_captura.PNG', 'red'))
+        third = self.create_forum(self.upload('captura.png', 'blue'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, third.image.name)
+        self.assertRegex(first.image.name, r'^forum_images/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+
+    def test_garbage_collection_keeps_referenced_files(self):
+        first = self.create_forum(self.upload('captura.png', 'red'))
+        second = self.create_forum(self.upload('captura.png', 'red'))
+        orphan = self.create_forum(self.upload('captura.png', 'blue'))
+        orphan_path = orphan.image.path
+        orphan.delete()
+
+        second.delete()
+        call_command('collect_media_garbage', grace_minutes=0, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(first.image.path))
+        self.assertFalse(os.path.exists(orphan_path))
+
+        first.delete()
+        call_command('collect_media_garbage', grace_minutes=0, stdout=io.StringIO())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'forum_images')), [])
+
+    def test_reuploading_an_old_orphan_restarts_its_grace_period(self):
+        orphan = self.create_forum(self.upload('captura.png', 'red'))
+        path = orphan.image.path
+        orphan.delete()
+        os.utime(path, (time.time() - 7200, time.time() - 7200))
+
+        forum = self.create_forum(self.upload('captura.png', 'red'))
+        self.assertEqual(forum.image.path, path)
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+        Forum.objects.filter(pk=forum.pk).delete()
+        call_command('collect_media_garbage', grace_minutes=60, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+
+    def test_garbage_collection_rechecks_references_before_deleting(self):
+        forum = self.create_forum(self.upload('captura.png', 'red'))
+        # Referencia confirmada después de que el comando leyera las referencias
+        with mock.patch('main.management.commands.collect_media_garbage.reference_counts', return_value=Counter()):
+            call_command('collect_media_garbage', grace_minutes=0, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(forum.image.path))
+
+
+@override_settings(JOBS_EAGER=True)
+class ForumImageRenditionTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.client.force_login(self.student)
+
+    def create_forum(self, size):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (255, 0, 0, 128)).save(buffer, 'PNG')
+        self.client.post(reverse('create_forum'), {
+            'title': 'Debate', 'description': '...',
+            'image': SimpleUploadedFile('captura.png', buffer.getvalue(), content_type='image/png'),
+        })
+        return Forum.objects.latest('id')
+
+    def assertStoredImage(self, path, fmt, size):
+        with Image.open(os.path.join(self.media_root, path)) as image:
+            self.assertEqual((image.format, image.size), (fmt, size))
+
+    def test_upload_generates_webp_and_jpeg_renditions(self):
+        forum = self.create_forum((2000, 1000))
+
+        self.assertEqual(Job.objects.get().status, Job.Status.DONE)
+        self.assertEqual(set(forum.image_renditions), {'thumbnail', 'display'})
+        for name, size in (('thumbnail', (320, 160)), ('display', (1200, 600))):
+            rendition = forum.image_renditions[name]
+            self.assertEqual((rendition['width'], rendition['height']), size)
+            self.assertStoredImage(rendition['webp'], 'WEBP', size)
+            self.assertStoredImage(rendition['jpeg'], 'JPEG', size)
+        self.assertTrue(forum.image_rendition_urls['thumbnail']['webp'].startswith('/media/forum_images/renditions/'))
+
+        # El recolector las reconoce como referenciadas aunque se hayan guardado durante su pasada
+        with mock.patch('main.management.commands.collect_media_garbage.reference_counts', return_value=Counter()):
+            call_command('collect_media_garbage', grace_minutes=0, stdout=io.StringIO())
+        self.assertStoredImage(forum.image_renditions['display']['webp'], 'WEBP', (1200, 600))
+
+    def test_small_images_are_not_enlarged(self):
+        forum = self.create_forum((200, 100))
+        for rendition in forum.image_renditions.values():
+            self.assertEqual((rendition['width'], rendition['height']), (200, 100))
+            self.assertStoredImage(rendition['jpeg'], 'JPEG', (200, 100))
+
+
+class NotifyEventsTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.users = [
+            User.objects.create_user(
+                username=f'alumno{i}', email=f'alumno{i}@example.com', password='x', user_type='Student',
+            )
+            for i in range(3)
+        ]
+        self.events = [
+            Event.objects.create(
+                title=f'Evento {i}', user=self.users[i % 3],
+                start_time=now + timezone.timedelta(hours=i + 1), end_time=now + timezone.timedelta(hours=i + 2),
+            )
+            for i in range(7)
+        ]
+        Event.objects.create(
+            title='Lejano', user=self.users[0],
+            start_time=now + timezone.timedelta(days=3), end_time=now + timezone.timedelta(days=3, hours=1),
+        )
+
+    def notify(self):
+        call_command('notify_events', batch_size=3, stdout=io.StringIO())
+
+    def test_sends_each_reminder_once(self):
+        # Eventos normales y reglas periódicas (con sus usuarios) + una actualización por lote (3 lotes)
+        with self.assertMaxQueries(5):
+            self.notify()
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertEqual(mail.outbox[0].to, ['alumno0@example.com'])
+
+        self.notify()
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_scheduler_fires_due_reminders_once(self):
+        call_command('run_reminder_scheduler', once=True, stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 7)
+
+        call_command('run_reminder_scheduler', once=True, stdout=io.StringIO())
+        self.notify()
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_scheduler_keeps_running_and_retries_after_send_errors(self):
+        scheduler = ReminderScheduler(stdout=io.StringIO())
+        heap = ReminderHeap()
+        now = timezone.now()
+        scheduler.refresh(heap, now + REMINDER_LEAD)
+        due = heap.pop_due(now)
+        self.assertEqual(len(due), 7)
+
+        with override_settings(EMAIL_BACKEND='main.tests.FailingEmailBackend'):
+            sent = scheduler.fire(heap, due, batch_size=3, retry_delay=timezone.timedelta(minutes=1))
+        self.assertEqual(sent, 0)
+        self.assertFalse(Event.objects.filter(reminded_start_time__isnull=False).exists())
+
+        # Los fallidos vuelven al montículo y se reintentan pasado el retraso
+        self.assertEqual(heap.pop_due(timezone.now()), {})
+        due = heap.pop_due(timezone.now() + timezone.timedelta(minutes=2))
+        self.assertEqual(scheduler.fire(heap, due, batch_size=3, retry_delay=timezone.timedelta(minutes=1)), 7)
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_scheduler_refresh_only_reads_new_and_changed_events(self):
+        scheduler = ReminderScheduler(stdout=io.StringIO())
+        heap = ReminderHeap()
+        now = timezone.now()
+        Event.objects.update(updated_at=now - timezone.timedelta(hours=1))
+        loaded_until = now + REMINDER_LEAD
+        self.assertEqual(scheduler.refresh(heap, loaded_until), 7)
+
+        # Un cambio sin updated_at (update() no lo toca) no se vuelve a leer...
+        Event.objects.filter(pk=self.events[0].pk).update(start_time=now + timezone.timedelta(hours=12))
+        # ...pero sí un evento guardado, uno nuevo y uno que entra en la ventana al avanzar
+        self.events[1].start_time += timezone.timedelta(minutes=30)
+        self.events[1].save()
+        Event.objects.create(
+            title='Nuevo', user=self.users[0],
+            start_time=now + timezone.timedelta(hours=5), end_time=now + timezone.timedelta(hours=6),
+        )
+        Event.objects.create(
+            title='Siguiente', user=self.users[0],
+            start_time=loaded_until + timezone.timedelta(minutes=5), end_time=loaded_until + timezone.timedelta(hours=1),
+        )
+        Event.objects.filter(title='Siguiente').update(updated_at=now - timezone.timedelta(hours=1))
+
+        added = scheduler.refresh(heap, loaded_until + timezone.timedelta(minutes=10), loaded_until, now)
+        self.assertEqual(added, 3)
+        self.assertEqual(heap.scheduled[(self.events[0].pk, self.events[0].start_time)], self.events[0].start_time)
+
+    def test_event_moved_while_sending_is_not_marked(self):
+        occurrences = pending_reminders(timezone.now() + REMINDER_LEAD)
+        moved = occurrences[0]
+        Event.objects.filter(pk=moved.id).update(start_time=moved.start_time + timezone.timedelta(hours=1))
+        send_reminders(occurrences, mail.get_connection())
+
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertIsNone(Event.objects.get(pk=moved.id).reminded_start_time)
+        self.notify()
+        self.assertEqual(len(mail.outbox), 8)
+
+    def test_moved_event_is_reminded_again(self):
+        self.notify()
+        event = self.events[0]
+        event.start_time += timezone.timedelta(hours=2)
+        event.save()
+
+        self.notify()
+        self.assertEqual(len(mail.outbox), 8)
+
+    def create_series(self):
+        # Serie diaria que empezó hace una semana: solo la ocurrencia de dentro de 30 minutos cae en las próximas 24 horas
+        start = timezone.now() - timezone.timedelta(days=7) + timezone.timedelta(minutes=30)
+        return Event.objects.create(
+            title='Clase', user=self.users[1], start_time=start, end_time=start + timezone.timedelta(hours=1),
+            recurrence=Event.Recurrence.DAILY,
+        )
+
+    def test_recurring_event_reminds_each_occurrence_once(self):
+        series = self.create_series()
+        Event.objects.exclude(pk=series.pk).delete()
+        self.notify()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('"Clase"', mail.outbox[0].body)
+        reminder = EventReminder.objects.get()
+        self.assertEqual(reminder.original_start, series.start_time + timezone.timedelta(days=7))
+
+        self.notify()
+        self.assertEqual(len(mail.outbox), 1)
+
+        # La siguiente ocurrencia tiene su propio aviso cuando entra en la ventana
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timezone.timedelta(days=1)):
+            self.notify()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(EventReminder.objects.count(), 2)
+
+    def test_moved_and_cancelled_occurrences(self):
+        series = self.create_series()
+        Event.objects.exclude(pk=series.pk).delete()
+        original_start = series.start_time + timezone.timedelta(days=7)
+        self.notify()
+
+        # Una ocurrencia ya avisada que se mueve se vuelve a avisar con sus datos
+        exception = EventException.objects.create(
+            event=series, original_start=original_start, title='Clase movida',
+            start_time=original_start + timezone.timedelta(hours=2), end_time=original_start + timezone.timedelta(hours=3),
+        )
+        self.notify()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('"Clase movida"', mail.outbox[1].body)
+
+        # Una cancelada no se avisa
+        exception.is_cancelled = True
+        exception.start_time = exception.end_time = None
+        exception.save()
+        EventReminder.objects.all().delete()
+        self.notify()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_scheduler_fires_recurring_occurrences(self):
+        series = self.create_series()
+        call_command('run_reminder_scheduler', once=True, stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 8)
+        self.assertEqual(EventReminder.objects.get().event, series)
+
+        self.notify()
+        self.assertEqual(len(mail.outbox), 8)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('SMTP caído')
+
+
+@override_settings(SESSION_ACTIVITY_GRANULARITY=60)
+class SessionActivityTests(TestCase):
+    def setUp(self):
+        student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.client.force_login(student)
+
+    def set_last_activity(self, seconds_ago):
+        session = self.client.session
+        session['last_activity'] = (timezone.now() - timezone.timedelta(seconds=seconds_ago)).isoformat()
+        session.save()
+        return session['last_activity']
+
+    def stored_session(self):
+        return Session.objects.values_list('session_data', 'expire_date').get(pk=self.client.session.session_key)
+
+    def test_session_is_only_written_once_per_granularity_window(self):
+        last_activity = self.set_last_activity(10)
+        stored = self.stored_session()
+        self.client.get(reverse('home'))
+        self.assertEqual(self.stored_session(), stored)
+        self.assertEqual(self.client.session['last_activity'], last_activity)
+
+        last_activity = self.set_last_activity(120)
+        stored = self.stored_session()
+        self.client.get(reverse('home'))
+        self.assertNotEqual(self.stored_session(), stored)
+        self.assertGreater(self.client.session['last_activity'], last_activity)
+
+
+class DeleteUnactivatedUsersTests(TestCase):
+    def test_sweep_deletes_only_expired_unactivated_accounts(self):
+        old = timezone.now() - timezone.timedelta(minutes=45)
+        for username, is_active, created_at in [
+            ('caducado1', False, old), ('caducado2', False, old), ('caducado3', False, old),
+            ('reciente', False, timezone.now()), ('activo', True, old),
+        ]:
+            user = User.objects.create_user(username=username, email=f'{username}@example.com', password='x', user_type='Student')
+            User.objects.filter(pk=user.pk).update(is_active=is_active, created_at=created_at)
+
+        out = io.StringIO()
+        with mock.patch('main.management.commands.delete_unactivated_users.time.sleep') as sleep:
+            call_command('delete_unactivated_users', batch_size=2, pause=0.5, stdout=out)
+        self.assertIn('Se han eliminado 3 usuarios sin activar', out.getvalue())
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)), ['activo', 'reciente'])
+        # Una pausa entre el primer lote (completo) y el segundo
+        sleep.assert_called_once_with(0.5)
+
+
+class EmailOutboxTests(TestCase):
+    def register(self):
+        return self.client.post(reverse('register_student'), {
+            'username': 'nuevo', 'first_name': 'Ana', 'last_name': 'López', 'email': 'nuevo@example.com',
+            'password1': 'Contraseña-larga-1', 'password2': 'Contraseña-larga-1',
+            'degree': User.DegreeChoices.choices[0][0], 'group': User.GroupChoices.choices[0][0],
+        })
+
+    def send_queued_mail(self):
+        call_command('send_queued_mail', once=True, stdout=io.StringIO())
+
+    def test_registration_queues_activation_email(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().to, ['nuevo@example.com'])
+
+        self.send_queued_mail()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['nuevo@example.com'])
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, OutgoingEmail.Status.SENT)
+        # El enlace de activación no se queda guardado
+        self.assertIn('/activate/', mail.outbox[0].body)
+        self.assertEqual((email.body, email.html_body), ('', ''))
+
+        self.send_queued_mail()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_old_sent_and_failed_emails_are_purged(self):
+        old = timezone.now() - timezone.timedelta(days=8)
+        for status in OutgoingEmail.Status.values:
+            OutgoingEmail.objects.create(subject=status, body='...', to=['a@example.com'], status=status)
+        OutgoingEmail.objects.update(created_at=old, next_attempt_at=timezone.now() + timezone.timedelta(hours=1))
+        OutgoingEmail.objects.create(subject='Reciente', body='...', to=['a@example.com'], status=OutgoingEmail.Status.SENT)
+
+        self.send_queued_mail()
+        self.assertEqual(
+            sorted(OutgoingEmail.objects.values_list('subject', flat=True)),
+            sorted([OutgoingEmail.Status.PENDING, 'Reciente']),
+        )
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=60)
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.register()
+
+        with override_settings(EMAIL_BACKEND='main.tests.FailingEmailBackend'):
+            self.send_queued_mail()
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.Status.PENDING, 1))
+        self.assertGreater(email.next_attempt_at, timezone.now() + timezone.timedelta(seconds=50))
+
+        # Hasta que no pasa la espera no se vuelve a intentar
+        self.send_queued_mail()
+        self.assertEqual(len(mail.outbox), 0)
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        with override_settings(EMAIL_BACKEND='main.tests.FailingEmailBackend'):
+            self.send_queued_mail()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.Status.FAILED, 2))
+        self.assertIn('SMTP caído', email.last_error)
+
+
+class RenderingTests(SimpleTestCase):
+    def setUp(self):
+        rendering._cache.clear()
+
+    def test_repeated_content_is_served_from_the_cache(self):
+        with mock.patch('main.rendering.get_renderer', wraps=rendering.get_renderer) as get_renderer:
+            first = rendering.render_markdown('**Hola**')
+            second = rendering.render_markdown('**Hola**')
+            rendering.render_markdown('**Adiós**')
+        self.assertEqual(first, second)
+        self.assertEqual(str(first), '<p><strong>Hola</strong></p>')
+        self.assertEqual(get_renderer.call_count, 2)
+
+    def test_cache_evicts_the_least_recently_used_entry(self):
+        render_cache = rendering.RenderCache(max_size=2)
+        render_cache.set('a', '<p>a</p>')
+        render_cache.set('b', '<p>b</p>')
+        render_cache.get('a')
+        render_cache.set('c', '<p>c</p>')
+        self.assertEqual([render_cache.get(key) for key in 'abc'], ['<p>a</p>', None, '<p>c</p>'])
+
+    def test_each_thread_gets_its_own_renderer(self):
+        renderers = []
+        threads = [threading.Thread(target=lambda: renderers.append(rendering.get_renderer())) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIsNot(renderers[0], renderers[1])
+        self.assertIs(rendering.get_renderer(), rendering.get_renderer())
+        self.assertNotIn(rendering.get_renderer(), renderers)
+
+    def test_reused_renderer_does_not_leak_state(self):
+        rendering.render_markdown('Texto[^a]\n\n[^a]: Primera nota')
+        html = rendering.render_markdown('Otro texto')
+        self.assertEqual(str(html), '<p>Otro texto</p>')
+
+
+class SettingsTests(SimpleTestCase):
+    def load_settings(self, **environ):
+        environ = {key: 'x' for key in ('SECRET_KEY', 'DB_NAME', 'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT',
+                                        'EMAIL_HOST_USER', 'EMAIL_HOST_PASSWORD', 'OPENAI_API_KEY')} | environ
+        spec = importlib.util.spec_from_file_location('settings_under_test', settings.BASE_DIR / 'admin' / 'settings.py')
+        with mock.patch.dict(os.environ, environ):
+            spec.loader.exec_module(importlib.util.module_from_spec(spec))
+
+    def test_cache_sessions_require_a_shared_cache(self):
+        for backend in ('cache', 'cached_db'):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'REDIS_URL'):
+                self.load_settings(SESSION_BACKEND=backend, REDIS_URL='')
+            self.load_settings(SESSION_BACKEND=backend, REDIS_URL='redis://localhost:6379/0')
+        self.load_settings(SESSION_BACKEND='db', REDIS_URL='')
+
+
+class AccessPolicyTests(SimpleTestCase):
+    def test_url_names_do_not_match_namespaced_routes(self):
+        policy = AccessPolicy()
+        for rule in (policy.pending_teacher, policy.rejected_teacher, policy.teacher):
+            self.assertTrue(rule.matches(reverse('logout')))
+            self.assertFalse(rule.matches(reverse('admin:logout')))
+            self.assertFalse(rule.matches(reverse('admin:index')))
+        self.assertTrue(policy.pending_teacher.matches(reverse('pending_teacher')))
+        self.assertFalse(policy.pending_teacher.matches(reverse('rejected_teacher')))
+
+
+class ReminderHeapTests(SimpleTestCase):
+    def test_moved_events_fire_at_their_new_time(self):
+        now = timezone.now()
+        heap = ReminderHeap()
+        heap.push(1, now + REMINDER_LEAD + timezone.timedelta(minutes=5))
+        heap.push(2, now + REMINDER_LEAD + timezone.timedelta(minutes=1))
+        self.assertFalse(heap.push(2, now + REMINDER_LEAD + timezone.timedelta(minutes=1)))
+        heap.push(1, now + REMINDER_LEAD - timezone.timedelta(minutes=1))
+
+        self.assertEqual(heap.pop_due(now), {1: now + REMINDER_LEAD - timezone.timedelta(minutes=1)})
+        self.assertEqual(list(heap.pop_due(now + timezone.timedelta(minutes=10))), [2])
+        self.assertIsNone(heap.next_time())
+
+
+class CalendarEventsTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.client.force_login(self.student)
+        session = self.client.session
+        session['last_activity'] = timezone.now().isoformat()
+        session.save()
+
+        tz = timezone.get_current_timezone()
+        for day in (2, 15, 28):
+            start = timezone.datetime(2024, 10, day, 10, tzinfo=tz)
+            Event.objects.create(title=f'Evento {day}', user=self.student, start_time=start, end_time=start + timezone.timedelta(hours=1))
+        start = timezone.datetime(2024, 11, 20, 10, tzinfo=tz)
+        Event.objects.create(title='Noviembre', user=self.student, start_time=start, end_time=start + timezone.timedelta(hours=1))
+
+    def get_october(self, **headers):
+        return self.client.get(
+            reverse('calendar-events'),
+            {'start': '2024-09-30T00:00:00+02:00', 'end': '2024-11-11T00:00:00+01:00'},
+            **headers,
+        )
+
+    def test_only_events_in_range(self):
+        response = self.get_october()
+        self.assertEqual([event['title'] for event in response.json()], ['Evento 2', 'Evento 15', 'Evento 28'])
+        self.assertIn('Last-Modified', response)
+
+    def test_unchanged_range_returns_not_modified(self):
+        etag = self.get_october()['ETag']
+
+        # Sesión y usuario (2) + la agregación; los eventos no se leen
+        with self.assertMaxQueries(3):
+            response = self.get_october(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Event.objects.filter(title='Evento 15').delete()
+        response = self.get_october(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+
+class RecurringEventsTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username='alumno', email='alumno@example.com', password='x', user_type='Student',
+        )
+        self.client.force_login(self.student)
+
+        self.tz = timezone.get_current_timezone()
+        start = timezone.datetime(2024, 9, 10, 10, tzinfo=self.tz)
+        self.weekly = Event.objects.create(
+            title='Clase', user=self.student, start_time=start, end_time=start + timezone.timedelta(hours=2),
+            recurrence=Event.Recurrence.WEEKLY, recurrence_until=timezone.datetime(2025, 6, 30).date(),
+        )
+
+    def get_october(self, **headers):
+        return self.client.get(
+            reverse('calendar-events'),
+            {'start': '2024-09-30T00:00:00+02:00', 'end': '2024-11-11T00:00:00+01:00'},
+            **headers,
+        )
+
+    def occurrence_url(self, name, day):
+        key = timezone.datetime(2024, 10, day, 10, tzinfo=self.tz).isoformat()
+        return reverse(name, kwargs={'event_id': self.weekly.id}) + '?' + urlencode({'occurrence': key})
+
+    def test_feed_expands_only_the_requested_window(self):
+        occurrences = self.get_october().json()
+        self.assertEqual(
+            [occurrence['start'][:10] for occurrence in occurrences],
+            ['2024-10-01', '2024-10-08', '2024-10-15', '2024-10-22', '2024-10-29', '2024-11-05'],
+        )
+        # La hora local se mantiene al pasar al horario de invierno
+        self.assertEqual(occurrences[-1]['start'], '2024-11-05T10:00:00+01:00')
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_cancel_and_override_single_occurrences(self):
+        etag = self.get_october()['ETag']
+
+        self.client.post(self.occurrence_url('delete-event', 15))
+        self.client.post(self.occurrence_url('edit-event', 22), {
+            'save_changes': '1', 'title': 'Clase movida', 'color': '#ff0000',
+            'start_time': '2024-10-23T16:00', 'end_time': '2024-10-23T18:00',
+        })
+
+        response = self.get_october(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        occurrences = {occurrence['start'][:10]: occurrence['title'] for occurrence in response.json()}
+        self.assertNotIn('2024-10-15', occurrences)
+        self.assertNotIn('2024-10-22', occurrences)
+        self.assertEqual(occurrences['2024-10-23'], 'Clase movida')
+        self.assertEqual(occurrences['2024-10-29'], 'Clase')
+
+    def test_editing_series_start_rekeys_exceptions(self):
+        self.client.post(self.occurrence_url('delete-event', 15))
+        self.client.post(self.occurrence_url('edit-event', 22), {
+            'save_changes': '1', 'title': 'Clase movida', 'color': '#ff0000',
+            'start_time': '2024-10-23T16:00', 'end_time': '2024-10-23T18:00',
+        })
+
+        # La serie pasa a las 11:00: las excepciones se mueven con ella
+        series_data = {
+            'save_changes': '1', 'title': 'Clase', 'color': '#0000ff',
+            'start_time': '2024-09-10T11:00', 'end_time': '2024-09-10T13:00',
+            'recurrence': Event.Recurrence.WEEKLY, 'recurrence_interval': '1', 'recurrence_until': '2025-06-30',
+        }
+        self.client.post(reverse('edit-event', kwargs={'event_id': self.weekly.id}), series_data)
+        self.assertEqual(
+            sorted(timezone.localtime(start, self.tz).isoformat() for start in self.weekly.exceptions.values_list('original_start', flat=True)),
+            ['2024-10-15T11:00:00+02:00', '2024-10-22T11:00:00+02:00'],
+        )
+        occurrences = {occurrence['start'][:10]: occurrence['title'] for occurrence in self.get_october().json()}
+        self.assertNotIn('2024-10-15', occurrences)
+        self.assertEqual(occurrences['2024-10-23'], 'Clase movida')
+        self.assertEqual(occurrences['2024-10-29'], 'Clase')
+
+        # Con otra regla ya no corresponden a ninguna ocurrencia y se borran
+        self.client.post(
+            reverse('edit-event', kwargs={'event_id': self.weekly.id}), {**series_data, 'recurrence': Event.Recurrence.DAILY},
+        )
+        self.assertFalse(self.weekly.exceptions.exists())
+
+    def test_invalid_occurrence_is_rejected(self):
+        key = timezone.datetime(2024, 10, 16, 10, tzinfo=self.tz).isoformat()
+        url = reverse('delete-event', kwargs={'event_id': self.weekly.id}) + '?' + urlencode({'occurrence': key})
+        self.client.post(url)
+        self.assertFalse(self.weekly.exceptions.exists())
+        self.assertTrue(Event.objects.filter(pk=self.weekly.pk).exists())
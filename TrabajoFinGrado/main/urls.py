@@ -30,6 +30,7 @@ urlpatterns = [
     path('profile/edit/', edit_profile, name='edit_profile'),
     path('chat/<int:chat_id>/', chat_view, name='chat'),  # Ruta con chat_id
     path('chat/', chat_view, name='chat_default'),        # Ruta sin chat_id
+    path('chat/<int:chat_id>/stream/', chat_stream, name='chat_stream'),
     path('chat/archived/<int:chat_id>/', archived_chat_view, name='archived_chat'),
     path('chat/archive/<int:chat_id>/', archive_chat, name='archive_chat'),
     path('chats/archived/', archived_chats_list, name='archived_chats_list'),  # Lista de chats archivados
@@ -41,6 +42,7 @@ urlpatterns = [
     path('exam/<int:exam_id>/', exam_detail, name='exam_detail'),
     path('exam/<int:exam_id>/submit/', submit_exam, name='submit_exam'),
     path('exam/<int:exam_id>/archived/', archived_exam, name='archived_exam'),
+    path('jobs/<int:job_id>/', job_status, name='job_status'),
     path('calendar/', calendar_view, name='calendar'),
     path('calendar/day/<str:date>/', day_view, name='day-view'),
     path('calendar/edit/<int:event_id>/', edit_event, name='edit-event'),  
@@ -52,6 +54,7 @@ urlpatterns = [
     path('forums/create/', create_forum, name='create_forum'),
     path('forums/<int:forum_id>/', view_forum, name='view_forum'),
     path('forums/<int:forum_id>/close/', close_forum, name='close_forum'),
+    path('forums/<int:forum_id>/comments/', forum_new_comments, name='forum_new_comments'),
     path('tema-1/', view_tema1, name='tema1'),
     path('tema-2/', view_tema2, name='tema2'),
     path('tema-3/', view_tema3, name='tema3'),
@@ -2,40 +2,47 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView, PasswordResetConfirmView
 from django.contrib.auth import login, get_user_model, authenticate
-from django.contrib.auth.forms import PasswordResetForm
 from django.conf import settings
-from django.core.mail import EmailMessage, send_mail
-from django.http import HttpResponseForbidden, JsonResponse
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.utils.encoding import force_bytes
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode  
-from django.utils import timezone
+from django.utils.http import http_date, urlencode, urlsafe_base64_encode, urlsafe_base64_decode  
+from django.utils import dateformat, timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce
 from django.contrib.sites.shortcuts import get_current_site
 from django.template.loader import render_to_string
-from django.utils.safestring import mark_safe
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 
+from asgiref.sync import sync_to_async
 from datetime import datetime, timedelta
 
-from .forms import UserRegistrationForm, UserProfileForm, ChatForm, ExerciseGenerationForm, ExamGenerationForm, CustomAuthenticationForm, EmailUpdateForm, ForumForm, CommentForm  
-from .models import User, Chat, Exam, Exercise, ExerciseSet, Event, Forum, Comment
+from .forms import UserRegistrationForm, UserProfileForm, ChatForm, ExerciseGenerationForm, ExamGenerationForm, CustomAuthenticationForm, EmailUpdateForm, ForumForm, CommentForm, OutboxPasswordResetForm  
+from .models import User, Chat, Exam, Exercise, ExerciseSet, Event, EventException, Forum, Comment, Job
 from .tokens import account_activation_token  
-
-from django.utils.dateparse import parse_datetime
+from . import jobs, llm
+from .chat_context import build_chat_context
+from .outbox import queue_email
+from .recurrence import expand_all, get_occurrence, occurrences_between, overlapping_events, rekey_exceptions
+from .rendering import render_markdown
+from .search import filter_students, paginate_students, search_students, student_list_cache_key
+
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 
 
-import openai
+import copy
+import hashlib
 import json
-import markdown
 import re
 
 #~~~~~~~~HOME~~~~~~~~
 def home(request):
 
-    delete_unactivated_users()
-
     context = {
         'message': "Bienvenido a la plataforma.",
         'user_type': "Guest"
@@ -49,26 +56,19 @@ def home(request):
             group_filters = request.GET.getlist('groups')  
 
 
-            students = User.objects.filter(user_type='Student').order_by('username')
+            cursor = request.GET.get('after')
 
-            if search_query:
-                students = students.filter(
-                    Q(username__icontains=search_query) |
-                    Q(first_name__icontains=search_query) |
-                    Q(last_name__icontains=search_query) |
-                    Q(email__icontains=search_query)
-                )
-            
-            if degree_filters:
-                students = students.filter(degree__in=degree_filters)
-            
-            if group_filters:
-                students = students.filter(group__in=group_filters)
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return student_list_response(request, search_query, degree_filters, group_filters, cursor)
+
+            students, next_cursor = get_student_page(search_query, degree_filters, group_filters, cursor)
 
             context.update({
                 'message': "Bienvenido, Profesor.",
                 'user_type': "Teacher",
                 'students': students,
+                'next_cursor': next_cursor,
+                'next_query': next_student_page_query(search_query, degree_filters, group_filters, next_cursor),
                 'degrees': User.DegreeChoices.choices,  
                 'selected_degrees': degree_filters,  
                 'search_query': search_query,
@@ -76,9 +76,6 @@ def home(request):
                 'selected_groups': group_filters, 
 
             })
-            
-            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                return render(request, 'partials/student_list.html', {'students': students})
         
         elif request.user.user_type == 'Teacher' and request.user.verification_status == 'PENDING':
             return redirect('pending_teacher')
@@ -110,6 +107,57 @@ def home(request):
 
     return render(request, 'home.html', context)
 
+def next_student_page_query(search_query, degrees, groups, next_cursor):
+    """Query string de la página siguiente: los mismos filtros con el cursor cambiado (enlace sin JavaScript)."""
+    if next_cursor is None:
+        return ''
+    query = {'degrees': degrees, 'groups': groups, 'after': next_cursor}
+    if search_query:
+        query['search'] = search_query
+    return urlencode(query, doseq=True)
+
+
+def get_student_page(search_query, degrees, groups, cursor):
+    if search_query.strip():
+        # Las búsquedas se ordenan por relevancia y ya vienen limitadas
+        return search_students(search_query, degrees, groups), None
+    return paginate_students(filter_students(degrees, groups), cursor)
+
+
+def student_list_response(request, search_query, degrees, groups, cursor):
+    """
+    Parcial del listado de alumnos para las peticiones AJAX. El HTML se guarda
+    en caché unos segundos por combinación de filtros y se responde 304 si el
+    navegador ya tiene ese mismo HTML (ETag). Guardar o borrar un alumno
+    cambia la versión y con ello todas las claves.
+    """
+    # Con cursor solo se devuelven las filas nuevas (scroll infinito)
+    template = 'partials/student_rows.html' if cursor else 'partials/student_list.html'
+    cache_key = student_list_cache_key(search_query, degrees, groups, cursor, template)
+
+    content = cache.get(cache_key)
+    if content is None:
+        students, next_cursor = get_student_page(search_query, degrees, groups, cursor)
+        content = render_to_string(template, {
+            'students': students,
+            'next_cursor': next_cursor,
+            'next_query': next_student_page_query(search_query, degrees, groups, next_cursor),
+        }, request=request)
+        cache.set(cache_key, content, settings.STUDENT_LIST_CACHE_TTL)
+
+    # El ETag sale del HTML que se serviría, no de la versión: con una caché por
+    # proceso (locmem) la versión no se comparte entre workers, pero así un 304
+    # nunca es más antiguo que la entrada de caché (STUDENT_LIST_CACHE_TTL)
+    etag = '"%s"' % hashlib.sha1(content.encode('utf-8')).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['X-Requested-With'])
+    return response
+
 #~~~~~~~~REGISTERS~~~~~~~~
 
 def register(request):
@@ -133,8 +181,7 @@ def register_student(request):
                 'uid': urlsafe_base64_encode(force_bytes(user.pk)),
                 'token': account_activation_token.make_token(user),
             })
-            email = EmailMessage(mail_subject, message, to=[user.email])
-            email.send()
+            queue_email(mail_subject, message, [user.email])
             
             return render(request, 'register/registration_complete.html')  
     else:
@@ -160,8 +207,7 @@ def register_teacher(request):
                 'uid': urlsafe_base64_encode(force_bytes(user.pk)),
                 'token': account_activation_token.make_token(user),
             })
-            email = EmailMessage(mail_subject, message, to=[user.email])
-            email.send()
+            queue_email(mail_subject, message, [user.email])
             
             return render(request, 'register/registration_complete.html')  
     else:
@@ -215,8 +261,7 @@ def resend_activation_email(request):
                     'uid': urlsafe_base64_encode(force_bytes(user.pk)),
                     'token': account_activation_token.make_token(user),
                 })
-                email_message = EmailMessage(mail_subject, message, to=[email])
-                email_message.send()
+                queue_email(mail_subject, message, [email])
 
                 print("Correo de activación reenviado, redirigiendo a página de éxito")
                 return redirect('activation_resent')
@@ -242,8 +287,6 @@ class CustomLoginView(LoginView):
     template_name = 'login.html'
 
     def post(self, request, *args, **kwargs):
-        delete_unactivated_users()
-    
         form = self.get_form()
         username = request.POST.get('username')
         password = request.POST.get('password')
@@ -322,7 +365,7 @@ def password_reset_request(request):
         except User.DoesNotExist:
             return render(request, "recovery/password_reset_form.html", {"error": "El nombre de usuario no existe"})
 
-        form = PasswordResetForm({'email': user.email})
+        form = OutboxPasswordResetForm({'email': user.email})
         if form.is_valid():
             form.save(
                 request=request,
@@ -341,12 +384,11 @@ def username_recovery_request(request):
         email = request.POST.get("email")
         try:
             user = User.objects.get(email=email)
-            send_mail(
+            queue_email(
                 'Recuperación de Nombre de Usuario',
                 f'Tu nombre de usuario es: {user.username}',
-                'saympl3xfp.com',
                 [email],
-                fail_silently=False,
+                'saympl3xfp.com',
             )
             return redirect('username_recovery_done')
         except User.DoesNotExist:
@@ -388,21 +430,26 @@ class CustomPasswordResetConfirmView(PasswordResetConfirmView):
 
 @login_required
 def forum_home(request):
-    # Consulta los foros que no están cerrados y ordénalos por fecha de creación
-    open_forums = Forum.objects.filter(is_closed=False).order_by('-created_at')
-    
-    # Consulta los foros que están cerrados y ordénalos por fecha de creación
-    closed_forums = Forum.objects.filter(is_closed=True).order_by('-created_at')
-    
-    # Concatenamos ambas listas: primero los abiertos, luego los cerrados
-    all_forums = list(open_forums) + list(closed_forums)
+    # Una sola consulta: primero los abiertos y luego los cerrados, cada grupo
+    # por fecha de creación, con el autor y el número de comentarios
+    forums = (
+        Forum.objects.select_related('created_by')
+        .annotate(
+            comment_count=Count('comments'),
+            last_activity=Coalesce(Max('comments__created_at'), 'created_at'),
+        )
+        .order_by('is_closed', '-created_at', '-id')
+    )
+
+    page = Paginator(forums, settings.FORUM_PAGE_SIZE).get_page(request.GET.get('page'))
 
     # Los foros recientes solo incluyen los que están abiertos
-    recent_forums = open_forums[:5]
+    recent_forums = Forum.objects.filter(is_closed=False).select_related('created_by').order_by('-created_at')[:5]
     
     context = {
         'recent_forums': recent_forums,
-        'all_forums': all_forums,
+        'all_forums': page,
+        'page_obj': page,
     }
     return render(request, 'forum/forum_home.html', context)
 
@@ -414,6 +461,9 @@ def create_forum(request):
             forum = form.save(commit=False)
             forum.created_by = request.user
             forum.save()
+            if forum.image:
+                # Las versiones reducidas se generan en el worker; mientras tanto se muestra el original
+                jobs.enqueue('forum_image_renditions', request.user, forum_id=forum.id)
             return redirect('forum_home')
     else:
         form = ForumForm()
@@ -421,8 +471,7 @@ def create_forum(request):
 
 @login_required
 def view_forum(request, forum_id):
-    forum = get_object_or_404(Forum, pk=forum_id)
-    comments = forum.comments.all().order_by('created_at')
+    forum = get_object_or_404(Forum.objects.select_related('created_by'), pk=forum_id)
     if request.method == 'POST':
         form = CommentForm(request.POST)
         if form.is_valid():
@@ -433,13 +482,41 @@ def view_forum(request, forum_id):
             return redirect('view_forum', forum_id=forum.id)
     else:
         form = CommentForm()
+
+    before = request.GET.get('before')
+    comments, has_more = forum.get_comments(before=int(before) if before and before.isdigit() else None)
+
     context = {
         'forum': forum,
         'comments': comments,
+        'older_comments': comments[0].id if has_more else None,
+        'latest_comment': comments[-1].id if comments else 0,
         'form': form,
     }
     return render(request, 'forum/view_forum.html', context)
 
+@login_required
+def forum_new_comments(request, forum_id):
+    """Comentarios posteriores a ?after= en JSON, para cargar los nuevos sin recargar la página."""
+    forum = get_object_or_404(Forum, pk=forum_id)
+    after = request.GET.get('after', '')
+    if not after.isdigit():
+        return JsonResponse({'status': 'error', 'message': 'Parámetro after no válido.'}, status=400)
+
+    comments = forum.get_comments_after(int(after))
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.id,
+                'author': comment.user.username,
+                'content': comment.content,
+                'created_at': dateformat.format(timezone.localtime(comment.created_at), 'd M Y H:i'),
+            }
+            for comment in comments
+        ],
+        'latest': comments[-1].id if comments else int(after),
+    })
+
 @login_required
 def close_forum(request, forum_id):
     forum = get_object_or_404(Forum, pk=forum_id, created_by=request.user)
@@ -470,11 +547,25 @@ def teacher_list(request):
 
 #~~~~~~~~CHAT~~~~~~~~
 
-openai.api_key = settings.OPENAI_API_KEY
+def get_processed_messages(request, chat):
+    """
+    Página de mensajes del chat (los más recientes, o los anteriores a ?before=)
+    con el contenido del asistente ya convertido a HTML. Devuelve también la
+    secuencia desde la que pedir mensajes más antiguos, o None si no hay.
+    """
+    before = request.GET.get('before')
+    before = int(before) if before and before.isdigit() else None
+    messages, has_more = chat.get_messages(before=before)
 
-def process_message_content(message):
-    """Convierte el contenido markdown a HTML seguro."""
-    return mark_safe(markdown.markdown(message, extensions=['fenced_code', 'codehilite', 'extra']))
+    processed_conversation = []
+    for message in messages:
+        content = message.content
+        if message.role == 'assistant':
+            content = message.get_html()
+        processed_conversation.append({'role': message.role, 'content': content})
+
+    older_messages = messages[0].sequence if has_more else None
+    return processed_conversation, older_messages
 
 @login_required
 def chat_view(request, chat_id=None):
@@ -484,7 +575,7 @@ def chat_view(request, chat_id=None):
         if chat:
             return redirect('chat', chat_id=chat.chat_id)
         else:
-            chat = Chat.objects.create(student=request.user, conversation=json.dumps([]))
+            chat = Chat.objects.create(student=request.user)
             return redirect('chat', chat_id=chat.chat_id)
     else:
         chat = get_object_or_404(Chat, chat_id=chat_id)
@@ -502,26 +593,80 @@ def chat_view(request, chat_id=None):
 
             chat.add_message(role="user", content=user_input)
 
-            response = openai.ChatCompletion.create(
+            response_text = llm.get_backend().chat_completion(
                 model="gpt-4o-mini",  
-                messages=chat.get_conversation()
+                messages=build_chat_context(chat)
             )
-            response_text = response['choices'][0]['message']['content']
 
             chat.add_message(role="assistant", content=response_text)
 
     else:
         form = ChatForm()
 
-    conversation = chat.get_conversation()
-    processed_conversation = []
-    
-    for message in conversation:
-        if message['role'] == 'assistant':
-            message['content'] = process_message_content(message['content'])
-        processed_conversation.append(message)
+    processed_conversation, older_messages = get_processed_messages(request, chat)
+
+    return render(request, 'chat/chat.html', {
+        'form': form,
+        'chat': chat,
+        'conversation': processed_conversation,
+        'older_messages': older_messages,
+    })
+
+
+def sse_event(data, event=None):
+    """Formatea un mensaje Server-Sent Events."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+@sync_to_async
+def get_chat_for_stream(request, chat_id):
+    """Devuelve el chat si el usuario puede escribir en él, o None."""
+    if not request.user.is_authenticated:
+        return None
+    chat = Chat.objects.filter(chat_id=chat_id, is_archived=False).first()
+    if chat is None or (request.user != chat.student and request.user.user_type != 'Teacher'):
+        return None
+    return chat
+
 
-    return render(request, 'chat/chat.html', {'form': form, 'chat': chat, 'conversation': processed_conversation})
+async def chat_stream(request, chat_id):
+    """
+    Versión en streaming de chat_view: envía la respuesta del asistente como
+    Server-Sent Events según se genera y la guarda una sola vez al terminar.
+    Requiere servir la aplicación con ASGI (admin/asgi.py).
+    """
+    if request.method != "POST":
+        return JsonResponse({'status': 'error', 'message': 'Método no permitido.'}, status=405)
+
+    chat = await get_chat_for_stream(request, chat_id)
+    if chat is None:
+        return HttpResponseForbidden("No tienes permiso para acceder a este chat.")
+
+    form = ChatForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'message': 'Mensaje vacío.'}, status=400)
+
+    await sync_to_async(chat.add_message)(role="user", content=form.cleaned_data['user_input'])
+    messages = await sync_to_async(build_chat_context)(chat)
+
+    async def event_stream():
+        tokens = []
+        try:
+            async for token in llm.get_backend().chat_stream(model="gpt-4o-mini", messages=messages):
+                tokens.append(token)
+                yield sse_event({'token': token})
+        except Exception:
+            yield sse_event({'message': 'Error al generar la respuesta.'}, event='error')
+            return
+
+        message = await sync_to_async(chat.add_message)(role="assistant", content="".join(tokens))
+        yield sse_event({'html': message.html_content}, event='done')
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 
@@ -541,16 +686,12 @@ def archive_chat(request, chat_id):
 def archived_chat_view(request, chat_id):
     chat = get_object_or_404(Chat, chat_id=chat_id)
 
-    conversation = chat.get_conversation()
-    processed_conversation = []
-    for message in conversation:
-        if message['role'] == 'assistant':
-            message['content'] = process_message_content(message['content'])
-        processed_conversation.append(message)
-    
+    processed_conversation, older_messages = get_processed_messages(request, chat)
+
     return render(request, 'chat/archived_chat.html', {
         'chat': chat,
         'conversation': processed_conversation,
+        'older_messages': older_messages,
     })
 
 
@@ -578,36 +719,14 @@ def generate_exercises(request):
             number_of_exercises = int(form.cleaned_data['number_of_exercises'])
             set_name = form.cleaned_data['set_name']
 
-            exercise_set = ExerciseSet.objects.create(student=request.user, name=set_name)
-
-            for _ in range(number_of_exercises):
-                prompt = generate_prompt(topic, difficulty)
-
-                response = openai.Completion.create(
-                    model="gpt-3.5-turbo-instruct", 
-                    prompt=prompt, 
-                    max_tokens=600,
-                    temperature=1.0,
-                    frequency_penalty=1.0,  
-                    presence_penalty=0.5, 
-                    n=1,  
-                    stop=None  
-                )
-
-                generated_text = response['choices'][0]['text'].strip()
-                statement, solution = parse_generated_text(generated_text)
-
-                exercise = Exercise.objects.create(
-                    exercise_set=exercise_set,
-                    student=request.user,
-                    statement=statement,
-                    solution=solution,
-                    difficulty=difficulty,
-                    topic=topic
-                )
-                exercise.generate_html_content()
-
-            return redirect('exercise_set_detail', set_id=exercise_set.set_id)
+            job = jobs.enqueue(
+                'generate_exercises', request.user,
+                topic=topic,
+                difficulty=difficulty,
+                number_of_exercises=number_of_exercises,
+                set_name=set_name,
+            )
+            return job_wait_response(request, job)
 
     else:
         form = ExerciseGenerationForm()
@@ -617,47 +736,6 @@ def generate_exercises(request):
 
 
 
-def generate_prompt(topic, difficulty):
-    difficulty_explanation = {
-        'Easy': "El ejercicio debe ser sencillo, y no requerir conocimientos avanzados. Deberá ser fácilmente realizable y en poco tiempo",
-        'Medium': "El ejercicio debe tener un nivel intermedio de dificultad, adecuado para estudiantes con conocimientos básicos de programación. Debe requerir alrededor de 20 minutos para realizarlo y habrá que aplicar cierta lógica sobre los conceptos que trata el tema .",
-        'Hard': "El ejercicio debe ser desafiante, adecuado para estudiantes avanzados y requerir un entendimiento profundo del tema pasado como parámetro. Deberá requerir la aplicación de diversos conceptos relacionados con el tema concretado. Deberá estar pensado para realizarse en al menos, 30 minutos."
-    }
-    
-    # Define diferentes prompts en función del tema seleccionado
-    topic_prompts = {
-        1: f"Genera ejercicios de programación en Python sobre el tema 'Instrucciones y funciones' que cubran los siguientes conceptos fundamentales: Uso de funciones predefinidas (print(), help()) y creación de funciones propias con parámetros y return. 'Expresiones y tipos': Combinación de operadores aritméticos y variables. Trabajo con diferentes tipos de literales (cadenas, enteros, reales, lógicos). 'Listas y tuplas': Manipulación de listas y tuplas, acceso a elementos con índices y uso de len(). 'Diccionarios': Uso de diccionarios, modificación de valores y acceso mediante claves. 'Objetos y métodos': Uso de métodos de objetos (append() en listas) y funciones como dir() y help(). 'Control de flujo': Ejercicios con bucles for y estructuras if-elif-else. 'Módulos y paquetes': Importación y uso de módulos (random, matplotlib). 'Ficheros': Lectura de archivos de texto y CSV con open() y el módulo csv. 'Función principal': Organización del código con una función main(). Incluye ejemplos prácticos de dificultad progresiva para que los estudiantes comprendan estos conceptos.",
-        2: f"Genera ejercicios de programación en Python sobre el tema 'Variables'  que cubran los siguientes conceptos fundamentales: Almacenan valores; se explica cómo asignar, renombrar, y eliminar valores. 'Tipos Predefinidos': Incluyen lógicos, numéricos, cadenas, y contenedores (tuplas, listas, conjuntos, diccionarios), con operaciones básicas sobre ellos. 'Expresiones': Uso de operadores y conversión de tipos. 'Entrada/Salida': Uso de input y print, formateo de cadenas con format y f-strings. 'Diccionarios': Almacenan pares clave-valor, son mutables y accesibles por clave. 'Operaciones con Contenedores': Agregar, eliminar, concatenar y iterar sobre listas, conjuntos y diccionarios.",
-        3: f"Genera ejercicios de programación en Python sobre el tema 'Instrucciones Condicionales y Bucles' que cubran los siguientes conceptos fundamentales: Orden de ejecución de instrucciones, incluyendo llamadas a funciones y retornos. 'Instrucción if': Permite ejecutar bloques de código según condiciones con if, elif, y else. 'Bucles': while ejecuta un bloque mientras la condición sea verdadera, y for itera sobre secuencias. Incluye el uso de funciones range y zip para generar secuencias de números y recorrer múltiples secuencias simultáneamente, y la función enumerate para proporcionar índices y valores. 'Instrucción break': Termina un bucle antes de completarlo, mejorando la eficiencia. 'Tratamientos Secuenciales': Procesamiento de datos secuenciales con bucles y condiciones, como mostrar nombres, obtener artistas únicos, filtrar por año y duración, calcular tiempos totales, contar canciones, y encontrar la canción más larga o corta.",
-        4: f"Genera ejercicios de programación en Python sobre el tema 'Definición e Invocación de Funciones' que cubran los siguientes conceptos fundamentales: Crear y llamar bloques de instrucciones para ejecutar tareas específicas. 'Paso de Parámetros': Utilizar variables dentro de funciones que reciben valores al ser invocadas, con opciones de valores predeterminados y referencia por nombre. 'Funciones como Parámetros': Pasar funciones como argumentos a otras funciones y emplear funciones lambda para definiciones rápidas y anónimas. 'Tipado de Funciones': Especificar tipos de parámetros y valores de retorno para mejorar la claridad y detectar errores, incluyendo el uso de tipos compuestos y NamedTuple. 'Funciones de Orden Superior': Funciones que aceptan otras funciones como parámetros, facilitando la manipulación flexible de datos.",
-        5: f"Genera ejercicios de programación en Python sobre el tema 'Secuencias'que cubran los siguientes conceptos fundamentales: Tipos de datos que permiten recorrer y acceder a sus elementos. Incluyen listas (mutables), tuplas (inmutables) y rangos (secuencias de números generadas de forma perezosa). 'Listas': Se crean con corchetes [], permiten modificar y almacenar elementos. Se pueden realizar operaciones como acceso, manipulación, y modificación de contenido. 'Tuplas': Se crean con paréntesis (), son inmutables y se utilizan para almacenar datos heterogéneos. NamedTuple permite nombrar campos para mejorar la legibilidad. 'Comprensión de Listas': Sintaxis especial para crear listas aplicando una operación a cada elemento de una secuencia. 'Unpacking': Proceso de descomponer secuencias en variables individuales, útil para recoger valores devueltos por funciones. 'Operadores sobre Secuencias': Incluyen pertenencia (in, not in), concatenación (+), y replicación (*). 'Slicing': Permite extraer sub-secuencias usando :, especificando límites y pasos para seleccionar partes específicas de una secuencia. Estos conceptos facilitan la manipulación y manejo eficiente de datos en Python.",
-        6: f"Genera ejercicios de programación en Python sobre el tema 'Conjuntos y Diccionarios' que cubran los siguientes conceptos fundamentales: Características como ser mutables, sin duplicados y sin posición fija. Inicialización usando llaves {{}} o set(), eliminando duplicados de secuencias. Operaciones como unión, intersección, diferencia, diferencia simétrica, y verificación de pertenencia. 'Diccionarios': Definición como contenedores que indexan valores mediante claves explícitas (no numéricas). Características como ser mutables, con valores de cualquier tipo y claves inmutables (cadenas, números, tuplas). Inicialización vacía con {{}} o dict(), con tuplas, parámetros, zip, o llaves directas. Operaciones de acceso, adición/modificación, actualización, eliminación, obtener claves/valores, y consultar pertenencia. Recorrido iterando sobre claves, valores, o pares clave-valor. Definición por comprensión usando {{clave: valor for item in iterable}}. 'Tipos Especiales': Counter para conteos con valores enteros, permite contar, actualizar, sumar conteos y obtener elementos más comunes. defaultdict para proporcionar un valor por defecto para claves inexistentes.",
-
-    }
-
-    # Combina la explicación del nivel de dificultad con el prompt del tema
-    prompt = f" {topic_prompts.get(topic)}{difficulty_explanation[difficulty]}"
-    
-    # Añadir la instrucción para incluir "Código de la solución:" antes de la solución
-    prompt += " Después del enunciado, proporcione la solución en formato de código. Asegúrese de incluir 'Solución:' antes del código de la solución, ya que lo necesito en dicho formato"
-    prompt += " Evita ejercicios repetidos o muy comunes. Asegúrate de que la solución sea completa, correcta y esté bien estructurada, evitando errores de sintaxis o lógica."
-
-    return prompt
-
-
-def parse_generated_text(generated_text):
-    solution_split_keyword = "Solución:"
-    if solution_split_keyword in generated_text:
-        parts = generated_text.split(solution_split_keyword)
-        statement = parts[0].strip()
-        solution = parts[1].strip() if len(parts) > 1 else ""
-    else:
-        statement = generated_text.strip()
-        solution = ""  
-
-    return statement, solution
-
-
 @login_required
 def exercise_set_detail(request, set_id):
     exercise_set = get_object_or_404(ExerciseSet, set_id=set_id, student=request.user)
@@ -687,7 +765,7 @@ def render_exercises(request):
     exercises = Exercise.objects.all()
 
     for exercise in exercises:
-        exercise.statement = mark_safe(markdown.markdown(exercise.statement, extensions=['fenced_code', 'codehilite', 'extra']))
+        exercise.statement = render_markdown(exercise.statement)
 
     return render(request, 'exercise_set.html', {'exercises': exercises})
 
@@ -720,45 +798,12 @@ def generate_exam(request):
             topic_3 = form.cleaned_data['topic_3']
             topic_4 = form.cleaned_data['topic_4']
 
-            exam = Exam.objects.create(student=request.user, name=exam_name)
-
-            exercise_set = ExerciseSet.objects.create(student=request.user, name=exam_name)
-
-            exercise_configs = [
-                {'difficulty': 'Easy', 'topic': topic_1},
-                {'difficulty': 'Easy', 'topic': topic_2},
-                {'difficulty': 'Medium', 'topic': topic_3},
-                {'difficulty': 'Hard', 'topic': topic_4}
-            ]
-
-            for config in exercise_configs:
-                prompt = generate_prompt(config['topic'], config['difficulty'])
-
-                response = openai.ChatCompletion.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": "Eres un asistente que está generando contenido educacional para universitarios que están aprendiendo a programar en Python"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=500,
-                    temperature=0.7
-                )
-                generated_text = response['choices'][0]['message']['content'].strip()
-                statement, solution = parse_generated_text(generated_text)
-
-                exercise = Exercise.objects.create(
-                    student=request.user,
-                    statement=statement,
-                    solution=solution,
-                    difficulty=config['difficulty'],
-                    topic=config['topic'],
-                    exercise_set=exercise_set  
-                )
-                exercise.generate_html_content()
-
-                exam.exercises.add(exercise)
-
-            return redirect('exam_detail', exam_id=exam.exam_id)
+            job = jobs.enqueue(
+                'generate_exam', request.user,
+                exam_name=exam_name,
+                topics=[topic_1, topic_2, topic_3, topic_4],
+            )
+            return job_wait_response(request, job)
 
     else:
         form = ExamGenerationForm()
@@ -770,7 +815,7 @@ def generate_exam(request):
 def exam_detail(request, exam_id):
     exam = get_object_or_404(Exam, exam_id=exam_id)
 
-    if exam.student != request.user and not request.user.is_teacher:
+    if exam.student_id != request.user.id and not request.user.is_teacher:
         return HttpResponseForbidden("No tienes permiso para acceder a este examen.")
 
     if exam.is_submitted:
@@ -782,8 +827,12 @@ def exam_detail(request, exam_id):
     time_left = (exam.start_time + timezone.timedelta(minutes=90)) - timezone.now()
     time_left_seconds = max(time_left.total_seconds(), 0)
 
+    # Los ejercicios se consultan una vez y la plantilla recorre la lista dos veces
+    exercises = list(exam.exercises.order_by('exercise_id'))
+
     return render(request, 'exam/exam_detail.html', {
         'exam': exam,
+        'exercises': exercises,
         'time_left': time_left_seconds,
     })
 
@@ -794,83 +843,83 @@ def exam_detail(request, exam_id):
 def submit_exam(request, exam_id):
 
     exam = get_object_or_404(Exam, exam_id=exam_id, student=request.user)
-    exam.is_submitted = True
-    exam.submission_time = timezone.now()
-
-    for exercise in exam.exercises.all().order_by('exercise_id'):
-        student_solution_key = f'student_solution_{exercise.exercise_id}'
-        student_solution_value = request.POST.get(student_solution_key)
-
-
-        if student_solution_value:
-            exercise.student_solution = student_solution_value
-
-            prompt = f"""Estoy haciendo ejercicios de un examen y quiero evaluar la solución del siguiente ejercicio:
-            Enunciado del ejercicio:
-            {exercise.statement}
-            Solución del alumno:
-            {student_solution_value}
-            Solución esperada por el profesor:
-            {exercise.solution}
-            Responde únicamente con "correcto" o "incorrecto" en función de si el programa que 
-            te he pasado es correcto o no respecto al enunciado que se propone y a la solución que se pide y dame
-            una breve explicación si es necesario para señalar los fallos o aciertos del código."""
-
-            print("Sending prompt to OpenAI...")
-            response = openai.ChatCompletion.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Eres un asistente educativo que tiene que evaluar el resultado un ejercicio dado el enunciado de un ejercicio, la solución que ha proporcionado el alumno y la solución que ha generado una IA como posible solución del ejercicio."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=150
-            )
-            evaluation = response['choices'][0]['message']['content'].strip().lower()
-
-
-            if evaluation.startswith("correcto"):
-                exercise.is_correct = True
-                if exercise in exam.exercises.all()[:2]:
-                    exercise.score = 1.5
-                elif exercise == exam.exercises.all()[2]:
-                    exercise.score = 2.75
-                elif exercise == exam.exercises.all()[3]:
-                    exercise.score = 4.25
-            else:
-                exercise.is_correct = False
-                exercise.score = 0.0
-
-        else:
-            exercise.is_correct = False
-            exercise.score = 0.0
-            exercise.student_solution = ""  
-
-        exercise.save()
-
-    exam.save()
-    total_score = exam.grade
 
+    solutions = {}
+    for key, value in request.POST.items():
+        if key.startswith('student_solution_') and key[len('student_solution_'):].isdigit():
+            solutions[int(key[len('student_solution_'):])] = value
+
+    # El examen se marca como entregado (con la hora del envío, no la del final
+    # de la corrección) en la misma transacción en la que se guardan las
+    # respuestas y se encola la corrección. La actualización es condicional, así
+    # que una segunda entrega no cambia ninguna fila y no encola otra corrección.
+    # Si la corrección falla definitivamente el examen vuelve a quedar sin
+    # entregar (ver jobs.fail_grade_exam) con las respuestas guardadas.
+    with transaction.atomic():
+        submitted = Exam.objects.filter(pk=exam.pk, is_submitted=False).update(
+            is_submitted=True, submission_time=timezone.now(),
+        )
+        if submitted:
+            exercises = list(exam.exercises.all())
+            for exercise in exercises:
+                exercise.student_solution = solutions.get(exercise.exercise_id, '')
+            Exercise.objects.bulk_update(exercises, ['student_solution'])
+            job = jobs.enqueue('grade_exam', request.user, exam_id=exam.exam_id, solutions=solutions)
+            return job_wait_response(request, job)
 
-    return render(request, 'exam/archived_exam.html', {'exam': exam, 'total_score': total_score})
+    # Ya entregado: se sigue esperando a la corrección en curso, si la hay
+    job = (
+        Job.objects.filter(user=request.user, kind='grade_exam', payload__exam_id=exam.exam_id)
+        .exclude(status__in=[Job.Status.DONE, Job.Status.FAILED])
+        .order_by('-created_at')
+        .first()
+    )
+    if job is not None:
+        return job_wait_response(request, job)
+    return redirect('archived_exam', exam_id=exam.exam_id)
 
 
 
 
 @login_required
 def archived_exam(request, exam_id):
-    exam = get_object_or_404(Exam, exam_id=exam_id, is_submitted=True)
+    exam = get_object_or_404(Exam.objects.with_exercises(), exam_id=exam_id, is_submitted=True)
     
-    if request.user != exam.student and not request.user.is_teacher:
+    if exam.student_id != request.user.id and not request.user.is_teacher:
         return HttpResponseForbidden("No tienes permiso para acceder a este examen.")
     
     total_score = exam.grade
     return render(request, 'exam/archived_exam.html', {
         'exam': exam,
+        'exercises': exam.exercise_list,
         'total_score': total_score,
     })
 
 
 
+#~~~~~~JOBS~~~~~~~~
+
+def job_wait_response(request, job):
+    """Respuesta inmediata tras encolar un job: JSON para AJAX o la página que consulta su estado."""
+    status_url = reverse('job_status', kwargs={'job_id': job.job_id})
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'job_id': job.job_id, 'status_url': status_url}, status=202)
+    return render(request, 'job/job_wait.html', {'job': job, 'status_url': status_url})
+
+
+@login_required
+def job_status(request, job_id):
+    job = get_object_or_404(Job, job_id=job_id, user=request.user)
+    return JsonResponse({
+        'job_id': job.job_id,
+        'kind': job.kind,
+        'status': job.status,
+        'is_finished': job.is_finished,
+        'result_url': job.result_url,
+    })
+
+
+
 #~~~~ CALENDARIO ~~~~~~
 
 
@@ -879,11 +928,11 @@ def calendar_view(request):
     now = timezone.now()
     thirty_days_from_now = now + timedelta(days=30)
     
-    upcoming_events = Event.objects.filter(
-        user=request.user,
-        start_time__gte=now,
-        start_time__lte=thirty_days_from_now
-    ).order_by('start_time')
+    # Incluye las ocurrencias de los eventos periódicos
+    upcoming_events = [
+        occurrence for occurrence in occurrences_between(Event.objects.filter(user=request.user), now, thirty_days_from_now)
+        if occurrence.start_time >= now
+    ]
     
     context = {
         'upcoming_events': upcoming_events
@@ -892,19 +941,78 @@ def calendar_view(request):
 
 
 
+def parse_calendar_bound(value):
+    """Acepta las fechas que envía FullCalendar (ISO con o sin hora); None si no es válida."""
+    if not value:
+        return None
+    try:
+        bound = parse_datetime(value)
+        if bound is None:
+            day = parse_date(value)
+            bound = datetime(day.year, day.month, day.day) if day else None
+    except ValueError:
+        return None
+    if bound is not None and timezone.is_naive(bound):
+        bound = timezone.make_aware(bound)
+    return bound
+
+
 @login_required
 def calendar_events(request):
-    events = Event.objects.filter(user=request.user)  
-    events_list = []
-    for event in events:
-        events_list.append({
-            'id': event.id,  
-            'title': event.title,
-            'start': event.start_time.isoformat(),
-            'end': event.end_time.isoformat(),
-            'color': event.color,  
-        })
-    return JsonResponse(events_list, safe=False)
+    """
+    Eventos del usuario que se solapan con el rango ?start=&end= que pide el
+    calendario. Responde con ETag y Last-Modified, de modo que volver a un mes
+    ya visto sin cambios devuelve 304 sin leer los eventos.
+    """
+    start = parse_calendar_bound(request.GET.get('start'))
+    end = parse_calendar_bound(request.GET.get('end'))
+    if (request.GET.get('start') and start is None) or (request.GET.get('end') and end is None):
+        return JsonResponse({'status': 'error', 'message': 'Rango de fechas no válido.'}, status=400)
+
+    # Usa el índice (user, start_time); las reglas periódicas se expanden solo para el rango pedido
+    events = overlapping_events(Event.objects.filter(user=request.user), start, end)
+
+    # Una consulta de agregación basta para saber si ha cambiado algo en el rango;
+    # el número de eventos y el id máximo detectan también los borrados
+    state = events.aggregate(count=Count('id'), max_id=Max('id'), last_modified=Max('updated_at'))
+    etag = '"%s"' % hashlib.sha1(
+        f"{start}|{end}|{state['count']}|{state['max_id']}|{state['last_modified']}".encode('utf-8')
+    ).hexdigest()
+    last_modified = state['last_modified'].timestamp() if state['last_modified'] else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        events_list = [
+            {
+                'id': event['id'],
+                'title': event['title'],
+                'start': event['start_time'].isoformat(),
+                'end': event['end_time'].isoformat(),
+                'color': event['color'],
+            }
+            for event in events.filter(recurrence=Event.Recurrence.NONE)
+            .order_by('start_time').values('id', 'title', 'start_time', 'end_time', 'color')
+        ]
+
+        # Sin rango (clientes antiguos) las series se expanden alrededor de hoy
+        now = timezone.now()
+        rules = events.exclude(recurrence=Event.Recurrence.NONE).prefetch_related('exceptions')
+        for occurrence in expand_all(rules, start or now - timedelta(days=31), end or now + timedelta(days=366)):
+            events_list.append({
+                'id': occurrence.id,
+                'occurrence': occurrence.occurrence_key,
+                'title': occurrence.title,
+                'start': occurrence.start_time.isoformat(),
+                'end': occurrence.end_time.isoformat(),
+                'color': occurrence.color,
+            })
+        response = JsonResponse(events_list, safe=False)
+
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @csrf_exempt
@@ -934,7 +1042,8 @@ def create_event(request):
 def day_view(request, date):
     date_obj = datetime.strptime(date, '%Y-%m-%d').date()
     
-    events = Event.objects.filter(start_time__date=date_obj, user=request.user)
+    day_start = timezone.make_aware(datetime.combine(date_obj, datetime.min.time()))
+    events = occurrences_between(Event.objects.filter(user=request.user), day_start, day_start + timedelta(days=1))
     error_message = None  
     
     if request.method == 'POST':
@@ -942,10 +1051,13 @@ def day_view(request, date):
         start_time = f"{date} {request.POST.get('start_time')}"
         end_time = f"{date} {request.POST.get('end_time')}"
         color = request.POST.get('color')
+        recurrence, recurrence_interval, recurrence_until, recurrence_error = parse_recurrence(request.POST)
 
         
         if end_time <= start_time:
             error_message = "La hora de finalización debe ser posterior a la hora de inicio."
+        elif recurrence_error:
+            error_message = recurrence_error
         else:
             
             Event.objects.create(
@@ -953,11 +1065,34 @@ def day_view(request, date):
                 start_time=start_time,
                 end_time=end_time,
                 color=color,
-                user=request.user  
+                user=request.user,
+                recurrence=recurrence,
+                recurrence_interval=recurrence_interval,
+                recurrence_until=recurrence_until,
             )
             return redirect('calendar')
 
-    return render(request, 'calendar/day_view.html', {'date': date, 'events': events, 'error_message': error_message})
+    return render(request, 'calendar/day_view.html', {
+        'date': date,
+        'events': events,
+        'error_message': error_message,
+        'recurrence_choices': Event.Recurrence.choices,
+    })
+
+
+def parse_recurrence(data):
+    """Lee los campos de repetición del formulario. Devuelve (regla, intervalo, hasta, mensaje de error)."""
+    recurrence = data.get('recurrence', '')
+    if recurrence not in Event.Recurrence.values:
+        return '', 1, None, "Tipo de repetición no válido."
+
+    interval = data.get('recurrence_interval') or '1'
+    until = parse_date(data.get('recurrence_until') or '') if data.get('recurrence_until') else None
+    if not interval.isdigit() or not 1 <= int(interval) <= 365:
+        return recurrence, 1, until, "El intervalo de repetición debe ser un número entre 1 y 365."
+    if data.get('recurrence_until') and until is None:
+        return recurrence, int(interval), None, "La fecha de fin de la repetición no es válida."
+    return recurrence, int(interval), until, None
 
 
 @login_required
@@ -965,6 +1100,12 @@ def edit_event(request, event_id):
     event = get_object_or_404(Event, id=event_id, user=request.user)
     error_message = None
 
+    # Con ?occurrence= se edita solo esa ocurrencia de la serie (se guarda como excepción)
+    occurrence_key = request.GET.get('occurrence')
+    occurrence, exception = get_occurrence(event, occurrence_key) if occurrence_key else (None, None)
+    if occurrence_key and occurrence is None:
+        return redirect('calendar')
+
     if request.method == 'POST':
         if 'save_changes' in request.POST:
             title = request.POST.get('title')
@@ -974,18 +1115,45 @@ def edit_event(request, event_id):
 
             if end_time <= start_time:
                 error_message = "La hora de finalización debe ser posterior a la hora de inicio."
-            else:
-                event.title = title
-                event.start_time = start_time
-                event.end_time = end_time
-                event.color = color
-                event.save()
+            elif occurrence is not None:
+                exception = exception or EventException(event=event, original_start=occurrence.original_start)
+                exception.title = title
+                exception.start_time = start_time
+                exception.end_time = end_time
+                exception.color = color
+                exception.save()
                 return redirect('calendar')
+            else:
+                recurrence, recurrence_interval, recurrence_until, error_message = parse_recurrence(request.POST)
+                if error_message is None:
+                    previous = copy.copy(event)
+                    event.title = title
+                    event.start_time = start_time
+                    event.end_time = end_time
+                    event.color = color
+                    event.recurrence = recurrence
+                    event.recurrence_interval = recurrence_interval
+                    event.recurrence_until = recurrence_until
+                    with transaction.atomic():
+                        event.save()
+                        # Las excepciones van por el inicio original de cada ocurrencia
+                        event.refresh_from_db(fields=['start_time', 'end_time'])
+                        rekey_exceptions(event, previous)
+                    return redirect('calendar')
         
         elif 'delete_event' in request.POST:
-            return redirect('delete-event', event_id=event.id)
-
-    return render(request, 'calendar/edit_event.html', {'event': event, 'error_message': error_message})
+            url = reverse('delete-event', kwargs={'event_id': event.id})
+            if occurrence is not None:
+                url += '?' + urlencode({'occurrence': occurrence_key})
+            return redirect(url)
+
+    return render(request, 'calendar/edit_event.html', {
+        'event': occurrence or event,
+        'series': event,
+        'occurrence_key': occurrence_key if occurrence else '',
+        'error_message': error_message,
+        'recurrence_choices': Event.Recurrence.choices,
+    })
 
 
 
@@ -993,17 +1161,23 @@ def edit_event(request, event_id):
 @login_required
 def delete_event(request, event_id):
     event = get_object_or_404(Event, id=event_id, user=request.user)
+
+    # Con ?occurrence= solo se cancela esa ocurrencia de la serie
+    occurrence_key = request.GET.get('occurrence')
+    occurrence, exception = get_occurrence(event, occurrence_key) if occurrence_key else (None, None)
+    if occurrence_key and occurrence is None:
+        return redirect('calendar')
     
     if request.method == 'POST':
-        event.delete()
+        if occurrence is not None:
+            exception = exception or EventException(event=event, original_start=occurrence.original_start)
+            exception.is_cancelled = True
+            exception.save()
+        else:
+            event.delete()
         return redirect('calendar')
 
-    return render(request, 'calendar/delete_event.html', {'event': event})
-
-def delete_unactivated_users():
-    expiration_time = timezone.now() - timezone.timedelta(minutes=30)
-    unactivated_users = User.objects.filter(is_active=False, created_at__lt=expiration_time)
-    unactivated_users.delete()
+    return render(request, 'calendar/delete_event.html', {'event': occurrence or event, 'series': event, 'occurrence_key': occurrence_key if occurrence else ''})
 
 
 #############################################################
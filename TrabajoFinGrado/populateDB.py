@@ -102,7 +102,6 @@ def populate():
         chat = Chat.objects.create(
             student=student,
             url=f"https://chat/{student.username}",
-            conversation="[]",
             is_archived=True  # Marcamos el chat como archivado
         )
         chat.add_message("user", f"Hola, soy {student.first_name}. ¿Cómo estás?")